@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+PaperBanana Best-of-N - Concurrent Candidates per Visualizer Round
+
+A critic round used to wait on a single visualizer image. This driver
+produces N candidates for one description at the same time, ranks them
+with the local checks in image_quality.py (the generators already reject
+degenerate images and regenerate degenerate diagrams), and keeps the best
+one, so a round takes about as long as one generation and the critic
+rarely spends a call on a blank or clipped image.
+
+    diagram  N Gemini samples of one description, run concurrently through
+             generate_diagram.py's manifest runner (shared client and rate
+             limiter; sample k has its own response-cache entry)
+    plot     N matplotlib code variants written for one description,
+             rendered in parallel through execute_plot.py's batch runner
+
+Candidates are written next to --output as {stem}_c{k}{suffix}. The best
+passing candidate is copied to --output; if none passes, nothing is copied
+and the exit code is 1.
+
+Usage:
+    python best_of_n.py diagram --description-file /abs/descriptions/critic_desc0.txt \
+        --output /abs/images/critic_desc0.jpg -n 4 [--aspect-ratio 16:9]
+    python best_of_n.py plot --code-file /abs/code/critic_desc0_c0_code.py \
+        --code-file /abs/code/critic_desc0_c1_code.py --output /abs/images/critic_desc0.jpg
+
+    Both accept --state STATE --state-key KEY: the winner is recorded as
+    {KEY}_image_path (and {KEY}_code for plots), and all passing candidates,
+    best first, as {KEY}_candidates. One JSON report is printed on stdout:
+        {"success": true, "path": "/abs/images/critic_desc0.jpg",
+         "best": {"candidate": 2, ...}, "ranking": [...], "elapsed": 41.2}
+    Per-candidate progress lines from the generators go to stderr.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import execute_plot
+import generate_diagram
+
+from disk_cache import DEFAULT_CACHE_ROOT, DiskCache
+from image_quality import assess, rank
+from pipeline_state import PipelineState
+
+DEFAULT_CANDIDATES = 4
+
+
+def candidate_path(output: Path, k: int) -> Path:
+    return output.with_name(f"{output.stem}_c{k}{output.suffix}")
+
+
+# ---------------------------------------------------------------------------
+# Generation
+# ---------------------------------------------------------------------------
+
+def generate_diagram_candidates(description: str, output: Path, n: int, aspect_ratio=None,
+                                cache=None) -> list:
+    """Generate n samples of one description concurrently; results in sample order."""
+    jobs = [
+        {"id": f"c{k}", "description": description, "output": str(candidate_path(output, k)),
+         "sample": k}
+        for k in range(n)
+    ]
+    defaults = {"aspect_ratio": aspect_ratio} if aspect_ratio else None
+
+    async def run():
+        try:
+            return await generate_diagram.run_manifest(jobs, n, defaults, cache)
+        finally:
+            await generate_diagram.close_client()
+
+    # The runners stream JSON lines to stdout; that is reserved for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        return asyncio.run(run())
+
+
+def render_plot_candidates(code_files: list, output: Path, sandbox=False) -> list:
+    """Render one code file per candidate in parallel; results in candidate order."""
+    jobs = [
+        {"id": f"c{k}", "code_file": str(code_file), "output": str(candidate_path(output, k))}
+        for k, code_file in enumerate(code_files)
+    ]
+    runner = execute_plot.run_sandboxed_job if sandbox else execute_plot.run_job
+    with contextlib.redirect_stdout(sys.stderr):
+        return execute_plot.run_batch(jobs, runner, len(jobs), sandboxed=sandbox)
+
+
+# ---------------------------------------------------------------------------
+# Selection
+# ---------------------------------------------------------------------------
+
+def rank_candidates(results: list, aspect_ratio=None, code_files=None) -> list:
+    """
+    Rank every generated candidate, best first. The generators already
+    attach an image_quality verdict ("quality") and fail degenerate images;
+    candidates without one are assessed here, in threads.
+    """
+    generated = [(k, r) for k, r in enumerate(results) if r and r.get("success")]
+
+    def verdict_for(item):
+        _, result = item
+        return dict(result.get("quality") or assess(result["path"], aspect_ratio))
+
+    with ThreadPoolExecutor(max_workers=max(1, len(generated))) as pool:
+        verdicts = list(pool.map(verdict_for, generated))
+    for (k, _), verdict in zip(generated, verdicts):
+        verdict["candidate"] = k
+        if code_files:
+            verdict["code_file"] = str(code_files[k])
+    return rank(verdicts)
+
+
+def select_best(ranking: list, output: Path, state=None, state_key=None) -> dict:
+    """Copy the best passing candidate to output and record it; returns it, or None."""
+    passing = [v for v in ranking if v["ok"]]
+    if not passing:
+        return None
+    best = passing[0]
+    shutil.copyfile(best["path"], output)
+    if state is not None and state_key:
+        changes = state.output_keys(state_key, image_path=output,
+                                    code_path=best.get("code_file"))
+        changes[f"{state_key}_candidates"] = [state.relative(v["path"]) for v in passing]
+        try:
+            state.update(changes)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not update {state.path}: {e}", file=sys.stderr)
+    return best
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Generate N candidates concurrently and keep the best one"
+    )
+    sub = parser.add_subparsers(dest="task_type", required=True)
+
+    diagram = sub.add_parser("diagram", help="N Gemini samples of one description")
+    desc = diagram.add_mutually_exclusive_group(required=True)
+    desc.add_argument("--description", help="Description text")
+    desc.add_argument("--description-file", help="File containing the description")
+    diagram.add_argument("-n", "--candidates", type=int, default=DEFAULT_CANDIDATES,
+                         help="Number of samples to generate concurrently")
+    diagram.add_argument("--aspect-ratio", default=None,
+                         help="Aspect ratio (default: generate_diagram.py's default)")
+    diagram.add_argument("--cache", action="store_true",
+                         help="Use the diagram response cache (as generate_diagram.py --cache, "
+                              f"or {generate_diagram.CACHE_ENV}=1)")
+
+    plot = sub.add_parser("plot", help="Render N code variants of one description")
+    plot.add_argument("--code-file", dest="code_files", action="append", required=True,
+                      help="Candidate code file; repeat once per candidate")
+    plot.add_argument("--sandbox", action="store_true",
+                      help="Run each candidate in a sandboxed subprocess")
+
+    for p in (diagram, plot):
+        p.add_argument("--output", required=True, help="Path the best candidate is copied to")
+        p.add_argument("--state", default=None, help="pipeline_state.json to record the winner in")
+        p.add_argument("--state-key", default=None,
+                       help="Description key, e.g. target_diagram_critic_desc0 (requires --state)")
+
+    args = parser.parse_args()
+    if args.state_key and not args.state:
+        parser.error("--state-key requires --state")
+    if args.task_type == "diagram" and args.candidates < 1:
+        parser.error("-n must be at least 1")
+    return args
+
+
+def main():
+    args = parse_args()
+    output = Path(args.output).resolve()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    state = PipelineState(args.state) if args.state else None
+    start = time.perf_counter()
+
+    if args.task_type == "diagram":
+        if args.description_file:
+            try:
+                description = Path(args.description_file).read_text(encoding="utf-8")
+            except OSError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+        else:
+            description = args.description
+        if not description.strip():
+            print("Error: No description provided.", file=sys.stderr)
+            sys.exit(1)
+
+        cache = None
+        env_cache = os.environ.get(generate_diagram.CACHE_ENV, "").lower() in ("1", "true", "yes")
+        if args.cache or env_cache:
+            cache = DiskCache(DEFAULT_CACHE_ROOT / "diagrams",
+                              max_bytes=generate_diagram.DEFAULT_CACHE_MAX_MB * 1024 * 1024,
+                              ttl=generate_diagram.DEFAULT_CACHE_TTL_DAYS * 86400)
+        results = generate_diagram_candidates(description, output, args.candidates,
+                                              args.aspect_ratio, cache)
+        ranking = rank_candidates(results, args.aspect_ratio)
+    else:
+        code_files = [Path(f).resolve() for f in args.code_files]
+        results = render_plot_candidates(code_files, output, args.sandbox)
+        ranking = rank_candidates(results, code_files=code_files)
+
+    best = select_best(ranking, output, state, args.state_key)
+    report = {
+        "success": best is not None,
+        "path": str(output) if best is not None else None,
+        "best": best,
+        "ranking": ranking,
+        "failed": [
+            {"candidate": k, "error": r.get("error") if r else "no result"}
+            for k, r in enumerate(results) if not (r and r.get("success"))
+        ],
+        "elapsed": round(time.perf_counter() - start, 3),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if best is None:
+        print("Error: No candidate passed the quality checks.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,16 +9,121 @@ Usage:
     python execute_plot.py --code-file /path/to/code.py [--output PATH]
     python execute_plot.py --code "import matplotlib..." [--output PATH]
     echo "import matplotlib..." | python execute_plot.py --code - [--output PATH]
+
+Worker mode (keeps matplotlib imported between jobs):
+    python execute_plot.py --serve                     # JSON lines on stdin/stdout
+    python execute_plot.py --serve --socket /tmp/plot.sock
+
+    Each request is one JSON object per line:
+        {"id": "stylist_desc0", "code_file": "/abs/code.py", "output": "/abs/out.jpg"}
+        {"code": "import matplotlib...", "output": "/abs/out.jpg"}
+    and is answered with one JSON object per line:
+        {"id": "stylist_desc0", "path": "/abs/out.jpg", "success": true, "error": null}
+
+Batch mode (renders many code files across a process pool):
+    python execute_plot.py --batch /abs/code/ --output /abs/images/ [--jobs N]
+    python execute_plot.py --batch manifest.json [--results results.json]
+
+    A directory batch renders every *.py file in it to {output}/{name}.jpg
+    (or the first tier's suffix), where a trailing "_code" is dropped from
+    the file stem. A manifest is a JSON list of job objects in the worker
+    format above; relative paths are resolved against the manifest's
+    directory. One JSON result line is
+    printed per finished job, with "elapsed" in seconds.
+
+Output tiers (one exec of the code, any number of saved files):
+    python execute_plot.py --code-file code.py --output out.jpg --tier preview
+    python execute_plot.py --code-file code.py --output out.jpg --tier final --tier pdf --tier svg
+
+    The first tier is written to --output, whose extension must match that
+    tier's format; each further tier is written next to it with the tier's
+    suffix (out.pdf, out.svg, out.preview.jpg), or as out.{tier}.jpg when
+    that name is taken (--output out.jpg --tier preview --tier final writes
+    out.jpg and out.final.jpg). Tiers: preview (100-dpi JPEG), final
+    (300-dpi JPEG, the default), pdf, svg.
+
+Rendered images are cached on disk, keyed on the parsed code and the render
+settings, so code that only differs in whitespace, comments or the markdown
+fence is not re-executed. Pass --no-cache to always execute.
+
+Sandboxed execution (each job in its own subprocess and process group):
+    python execute_plot.py --code-file code.py --sandbox [--timeout 120] \
+        [--cpu-limit 60] [--memory-limit-mb 2048]
+
+    A job that exceeds a limit is killed together with any children it
+    started, and its result reports why in "reason": timeout, cpu_limit,
+    memory_limit, crashed, exception, no_figure, empty_axes, degenerate or
+    invalid_job.
+    --sandbox also applies to --serve and --batch; other jobs are unaffected.
+
+Degenerate-output gate (see image_quality.py):
+    Before saving, a figure whose axes hold no plotted data fails with
+    reason "empty_axes". After saving, the first JPEG output is checked
+    locally (histogram entropy, edge density, share of non-background
+    pixels); a blank or featureless image fails with reason "degenerate".
+    Either way the result's "error" says why, and "quality" carries the
+    image verdict, so the code can be rewritten at once instead of going
+    to a critic round. --no-quality-check turns both checks off.
+
+Pipeline state (lock-protected, atomic updates; see pipeline_state.py):
+    python execute_plot.py --code-file /abs/code/desc0_code.py --output /abs/images/desc0.jpg \
+        --state /abs/pipeline_state.json --state-key target_plot_desc0
+
+    On success, {state-key}_image_path and {state-key}_code are set to paths
+    relative to the state file's directory. --serve and manifest jobs may
+    carry a "state_key"; a --batch directory uses target_{task_type}_{name},
+    with task_type read from the state. A batch records all of its successful
+    jobs in a single state update.
 """
 
 import argparse
+import ast
+import contextlib
+import functools
 import io
+import json
+import os
 import re
+import signal
+import socketserver
+import subprocess
 import sys
 import time
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
 from pathlib import Path
 
+from disk_cache import DEFAULT_CACHE_ROOT, DiskCache, make_key
+from pipeline_state import PipelineState
+
+# Output tiers: savefig settings plus the file suffix used for extra outputs.
+# Every tier is saved from the same executed figure.
+RENDER_TIERS = {
+    "preview": {"format": "jpeg", "dpi": 100, "bbox": "tight", "suffix": ".preview.jpg"},
+    "final": {"format": "jpeg", "dpi": 300, "bbox": "tight", "suffix": ".jpg"},
+    "pdf": {"format": "pdf", "dpi": 300, "bbox": "tight", "suffix": ".pdf"},
+    "svg": {"format": "svg", "dpi": 300, "bbox": "tight", "suffix": ".svg"},
+}
+DEFAULT_TIERS = ["final"]
+# File extensions accepted for --output, by the first tier's format
+OUTPUT_EXTENSIONS = {"jpeg": (".jpg", ".jpeg"), "pdf": (".pdf",), "svg": (".svg",)}
+DEFAULT_CACHE_MAX_MB = 256
+DEFAULT_TIMEOUT = 120
+DEFAULT_MEMORY_LIMIT_MB = 2048
+
+
+class PlotError(Exception):
+    """
+    A plot job failed; reason is a short machine-readable failure code and
+    quality the image_quality verdict, for images rejected as degenerate.
+    """
+
+    def __init__(self, reason: str, message: str, quality=None):
+        super().__init__(message)
+        self.reason = reason
+        self.quality = quality
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -33,14 +138,93 @@ def parse_args():
         "--code",
         help="Inline Python code string (use '-' to read from stdin)"
     )
+    group.add_argument(
+        "--serve", action="store_true",
+        help="Run as a long-lived worker that reads JSON-lines jobs"
+    )
+    group.add_argument(
+        "--batch",
+        help="Directory of *.py code files, or a JSON manifest of jobs"
+    )
     parser.add_argument(
         "--output", default=None,
-        help="Output file path (default: ./paper_banana_output/plot_{timestamp}.jpg)"
+        help="Output file path (default: ./paper_banana_output/plot_{timestamp}.jpg); "
+             "with a --batch directory, the output directory"
+    )
+    parser.add_argument(
+        "--tier", dest="tiers", action="append", choices=list(RENDER_TIERS),
+        help="Output tier; repeat for several outputs from one exec (default: final)"
+    )
+    parser.add_argument(
+        "--socket", default=None,
+        help="With --serve, listen on this Unix socket instead of stdin/stdout"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=None,
+        help="With --batch, number of worker processes (default: CPU count)"
+    )
+    parser.add_argument(
+        "--results", default=None,
+        help="With --batch, also write all job results to this JSON file"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Always execute the code instead of reusing a cached render"
+    )
+    parser.add_argument(
+        "--cache-dir", default=str(DEFAULT_CACHE_ROOT / "plots"),
+        help="Render cache directory (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_MB,
+        help=f"Render cache size cap in MB (default: {DEFAULT_CACHE_MAX_MB})"
+    )
+    parser.add_argument(
+        "--sandbox", action="store_true",
+        help="Run each job in a separate, resource-limited subprocess"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=None,
+        help=f"With --sandbox, wall-clock seconds per job (default: {DEFAULT_TIMEOUT})"
+    )
+    parser.add_argument(
+        "--cpu-limit", type=int, default=None,
+        help="CPU-time limit in seconds (RLIMIT_CPU); per job with --sandbox"
+    )
+    parser.add_argument(
+        "--memory-limit-mb", type=int, default=None,
+        help="Address-space limit in MB (RLIMIT_AS); per job with --sandbox "
+             f"(default with --sandbox: {DEFAULT_MEMORY_LIMIT_MB})"
+    )
+    parser.add_argument(
+        "--no-quality-check", action="store_true",
+        help="Skip the empty-axes and degenerate-image checks"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--state", default=None,
+        help="pipeline_state.json to record generated image and code paths in"
+    )
+    parser.add_argument(
+        "--state-key", default=None,
+        help="With --code-file/--code, the description key whose paths are recorded"
+    )
+    args = parser.parse_args()
+    if args.state_key and not (args.state and (args.code_file or args.code)):
+        parser.error("--state-key requires --state and --code-file or --code")
+    if args.timeout is not None and not args.sandbox:
+        parser.error("--timeout requires --sandbox")
+    if args.sandbox:
+        args.timeout = args.timeout or DEFAULT_TIMEOUT
+        args.memory_limit_mb = args.memory_limit_mb or DEFAULT_MEMORY_LIMIT_MB
+    if args.socket and not args.serve:
+        parser.error("--socket requires --serve")
+    if (args.jobs is not None or args.results) and not args.batch:
+        parser.error("--jobs and --results require --batch")
+    args.tiers = list(dict.fromkeys(args.tiers or DEFAULT_TIERS))
+    return args
 
 
-def ensure_output_path(output_arg):
+def ensure_output_path(output_arg, suffix=".jpg"):
     """Determine and create the output file path."""
     if output_arg:
         out_path = Path(output_arg).resolve()
@@ -48,7 +232,7 @@ def ensure_output_path(output_arg):
         out_dir = Path.cwd() / "paper_banana_output"
         out_dir.mkdir(parents=True, exist_ok=True)
         timestamp = int(time.time())
-        out_path = out_dir / f"plot_{timestamp}.jpg"
+        out_path = out_dir / f"plot_{timestamp}{suffix}"
     out_path.parent.mkdir(parents=True, exist_ok=True)
     return out_path
 
@@ -64,49 +248,627 @@ def extract_python_code(code_text: str) -> str:
     return code_text.strip()
 
 
-def execute_and_save(code_text: str, output_path: Path) -> bool:
+def reset_matplotlib_state():
     """
-    Execute matplotlib code and save the resulting figure as JPEG.
-    Logic from visualizer_agent.py:30-60.
-
-    Returns True on success, False on failure.
+    Put pyplot back into the state a fresh interpreter would see:
+    Agg backend, no open figures, default rcParams.
     """
     import matplotlib
     matplotlib.use("Agg")
     import matplotlib.pyplot as plt
 
-    code_clean = extract_python_code(code_text)
-
-    # Reset matplotlib state
     plt.switch_backend("Agg")
     plt.close("all")
     plt.rcdefaults()
+    return plt
+
+
+def _matplotlib_version() -> str:
+    """Installed matplotlib version, read without importing matplotlib."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("matplotlib")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def tier_output_paths(output_path: Path, tiers) -> dict:
+    """
+    Map each tier to its output file.
+
+    The first tier is written to output_path itself, whose extension must
+    match that tier's format. The others go next to it, named after the
+    base name (output_path's name without any tier suffix) plus the tier's
+    suffix, or plus .{tier}{extension} where that file is already taken,
+    so every tier gets a file of its own. Raises ValueError when the
+    extension does not match or two tiers would still share a file.
+    """
+    first = tiers[0]
+    extensions = OUTPUT_EXTENSIONS[RENDER_TIERS[first]["format"]]
+    if output_path.suffix.lower() not in extensions:
+        raise ValueError(f"Output {output_path.name} does not match the {first} tier "
+                         f"(expected {' or '.join(extensions)})")
+
+    name = output_path.name
+    base = output_path.stem
+    known = {settings["suffix"] for settings in RENDER_TIERS.values()} | {".jpeg"}
+    for suffix in sorted(known, key=len, reverse=True):
+        if name.lower().endswith(suffix) and len(name) > len(suffix):
+            base = name[: -len(suffix)]
+            break
+
+    paths = {first: output_path}
+    for tier in tiers[1:]:
+        suffix = RENDER_TIERS[tier]["suffix"]
+        path = output_path.with_name(base + suffix)
+        if path in paths.values():
+            extension = suffix[suffix.rfind("."):]
+            path = output_path.with_name(f"{base}.{tier}{extension}")
+        if path in paths.values():
+            raise ValueError(f"Tiers {first} and {tier} would both be written to {path.name}")
+        paths[tier] = path
+    return paths
+
+
+def render_cache_key(code_clean: str, tier: str) -> str:
+    """
+    Cache key for cleaned plot code plus the tier's render settings.
+
+    The code is keyed on its AST, so whitespace, comments and blank lines
+    do not matter; code that does not parse is keyed on its raw text.
+    """
+    settings = RENDER_TIERS[tier]
+    try:
+        code_repr = ast.dump(ast.parse(code_clean))
+    except (SyntaxError, ValueError):
+        code_repr = code_clean
+    return make_key(
+        "plot", code_repr, settings["format"], settings["dpi"], settings["bbox"],
+        _matplotlib_version(),
+    )
+
+
+def figure_has_data(fig) -> bool:
+    """
+    Whether the figure draws anything besides empty axes. Titles and axis
+    labels do not count; figure-level text only counts on a figure without
+    axes (suptitle is figure-level text).
+    """
+    if fig.images or fig.patches or fig.lines or fig.artists:
+        return True
+    if not fig.axes:
+        return bool(fig.texts)
+    return any(
+        ax.lines or ax.collections or ax.patches or ax.images or ax.texts
+        or ax.tables or ax.artists
+        for ax in fig.axes
+    )
+
+
+def render_plot(code_text: str, outputs: dict, cache=None, quality_check=True):
+    """
+    Execute matplotlib code once and save the figure for every tier.
+
+    outputs maps tier names to output paths (see tier_output_paths).
+
+    Returns (cached, quality): cached is True when every output came from
+    the render cache, quality the check_output_quality verdict (None
+    without quality_check). Raises PlotError if the code fails, creates no
+    figure, or (with quality_check) leaves the figure with nothing plotted
+    on its axes or saves a degenerate image. Only outputs that pass are
+    written to the cache.
+    """
+    code_clean = extract_python_code(code_text)
+
+    keys = {}
+    if cache is not None:
+        keys = {tier: render_cache_key(code_clean, tier) for tier in outputs}
+        hits = {tier: cache.get(key) for tier, key in keys.items()}
+        if all(data is not None for data in hits.values()):
+            for tier, path in outputs.items():
+                path.write_bytes(hits[tier])
+            return True, check_output_quality(outputs) if quality_check else None
+
+    plt = reset_matplotlib_state()
+    rendered = {}
 
     try:
         exec_globals = {}
         exec(code_clean, exec_globals)
 
         if not plt.get_fignums():
-            print("Error: Code executed but no matplotlib figure was created.", file=sys.stderr)
-            return False
+            raise PlotError("no_figure", "Error: Code executed but no matplotlib figure was created.")
+        if quality_check and not figure_has_data(plt.gcf()):
+            raise PlotError("empty_axes", "Error: The figure's axes contain no plotted data.")
 
-        # Save as JPEG
-        buf = io.BytesIO()
-        plt.savefig(buf, format="jpeg", bbox_inches="tight", dpi=300)
+        for tier, path in outputs.items():
+            settings = RENDER_TIERS[tier]
+            buf = io.BytesIO()
+            plt.savefig(buf, format=settings["format"], bbox_inches=settings["bbox"],
+                        dpi=settings["dpi"])
+            rendered[tier] = buf.getvalue()
+            path.write_bytes(rendered[tier])
         plt.close("all")
 
-        buf.seek(0)
-        output_path.write_bytes(buf.read())
-        return True
+    except PlotError:
+        plt.close("all")
+        raise
+    except MemoryError:
+        plt.close("all")
+        raise PlotError("memory_limit", "Error executing plot code: out of memory")
+    except (Exception, SystemExit) as e:
+        plt.close("all")
+        raise PlotError("exception", f"Error executing plot code: {e}")
 
-    except Exception as e:
-        print(f"Error executing plot code: {e}", file=sys.stderr)
+    quality = check_output_quality(outputs) if quality_check else None
+    for tier, key in keys.items():
+        try:
+            cache.put(key, rendered[tier])
+        except OSError as e:
+            print(f"Warning: Could not write render cache: {e}", file=sys.stderr)
+    return False, quality
+
+
+def check_output_quality(outputs: dict):
+    """
+    Run image_quality.assess on the first JPEG output and return its verdict
+    (None when every output is vector). Raises PlotError("degenerate") with
+    the verdict attached if the image is blank or featureless; the outputs
+    are removed first, so a failed job leaves no image behind.
+    """
+    for tier, path in outputs.items():
+        if RENDER_TIERS[tier]["format"] == "jpeg":
+            from image_quality import assess
+
+            quality = assess(path)
+            if not quality["ok"]:
+                for output in outputs.values():
+                    output.unlink(missing_ok=True)
+                raise PlotError(
+                    "degenerate",
+                    f"Error: Degenerate plot image ({', '.join(quality['issues'])}).",
+                    quality,
+                )
+            return quality
+    return None
+
+
+def execute_and_save(code_text: str, output_path: Path, cache=None, tiers=None,
+                     quality_check=True) -> bool:
+    """
+    Execute matplotlib code and save the resulting figure as JPEG.
+    Logic from visualizer_agent.py:30-60.
+
+    tiers selects the outputs (default: the 300-dpi "final" JPEG); all of
+    them are saved from a single exec. If a DiskCache is given, identical
+    code is served from it instead of being executed again. With
+    quality_check, empty axes and degenerate images count as failures.
+
+    Returns True on success, False on failure.
+    """
+    try:
+        outputs = tier_output_paths(output_path, tiers or DEFAULT_TIERS)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
         return False
+    try:
+        render_plot(code_text, outputs, cache, quality_check)
+    except PlotError as e:
+        print(str(e), file=sys.stderr)
+        return False
+    return True
+
+
+def open_render_cache(args):
+    """Return the DiskCache selected by the command line, or None."""
+    if args.no_cache:
+        return None
+    return DiskCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+
+
+def apply_resource_limits(cpu_limit=None, memory_limit_mb=None):
+    """Cap this process's CPU time and address space via setrlimit."""
+    import resource
+
+    if cpu_limit:
+        # SIGXCPU at the soft limit, SIGKILL one second later
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+    if memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+# ---------------------------------------------------------------------------
+# Worker and batch modes
+# ---------------------------------------------------------------------------
+
+def _job_result(job_id=None, **fields) -> dict:
+    """Result skeleton shared by every job-running path."""
+    result = {"id": job_id, "path": None, "paths": {}, "success": False,
+              "error": None, "reason": None, "cached": False, "quality": None}
+    result.update(fields)
+    return result
+
+
+def run_job(job: dict, cache=None, tiers=None, quality_check=True) -> dict:
+    """
+    Run a single worker job and return its JSON-serialisable result.
+
+    A job carries either "code" or "code_file", plus an optional "output"
+    path, an optional "tiers" list (default: tiers, else ["final"]) and an
+    optional "id" that is echoed back unchanged. "path" in the result is
+    the first tier's file; "paths" maps every tier to its file. With
+    quality_check, "quality" holds the image_quality verdict of the first
+    JPEG output, and empty axes or a degenerate image fail the job.
+    """
+    result = _job_result(job.get("id"))
+    cwd = os.getcwd()
+    start = time.perf_counter()
+    try:
+        if job.get("code_file"):
+            code_file = Path(job["code_file"])
+            if not code_file.exists():
+                result.update(error=f"File not found: {code_file}", reason="invalid_job")
+                return result
+            code_text = code_file.read_text(encoding="utf-8")
+        else:
+            code_text = job.get("code") or ""
+
+        if not code_text.strip():
+            result.update(error="No code provided.", reason="invalid_job")
+            return result
+
+        job_tiers = job.get("tiers") or tiers or DEFAULT_TIERS
+        if isinstance(job_tiers, str):
+            job_tiers = [job_tiers]
+        if not isinstance(job_tiers, list):
+            result.update(error="tiers must be a list of tier names", reason="invalid_job")
+            return result
+        unknown = [t for t in job_tiers if not isinstance(t, str) or t not in RENDER_TIERS]
+        if unknown:
+            result.update(error=f"Unknown tier(s): {', '.join(map(str, unknown))}",
+                          reason="invalid_job")
+            return result
+
+        out_path = ensure_output_path(job.get("output"), RENDER_TIERS[job_tiers[0]]["suffix"])
+        outputs = tier_output_paths(out_path, job_tiers)
+        # stdout carries the JSON-lines protocol; keep prints from plot code off it
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                result["cached"], result["quality"] = render_plot(code_text, outputs, cache,
+                                                                  quality_check)
+        except PlotError as e:
+            result.update(error=str(e), reason=e.reason, quality=e.quality)
+        else:
+            result["path"] = str(out_path.resolve())
+            result["paths"] = {tier: str(path.resolve()) for tier, path in outputs.items()}
+            result["success"] = True
+        return result
+    except (OSError, ValueError, TypeError) as e:
+        # Unreadable code file, uncreatable output directory, malformed fields
+        result.update(error=f"Invalid job: {e}", reason="invalid_job")
+        return result
+    finally:
+        # Plot code may chdir; keep relative job paths stable between jobs
+        os.chdir(cwd)
+        result["elapsed"] = round(time.perf_counter() - start, 3)
+
+
+def _kill_process_group(proc):
+    """SIGKILL a sandbox child's whole process group, ignoring a vanished group."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _read_buffered(pipe) -> bytes:
+    """
+    Read whatever is already in a pipe and close it, without waiting for
+    EOF (a process that escaped the kill may still hold the write end).
+    """
+    os.set_blocking(pipe.fileno(), False)
+    chunks = []
+    try:
+        while True:
+            try:
+                chunk = os.read(pipe.fileno(), 65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        pipe.close()
+    return b"".join(chunks)
+
+
+def run_sandboxed_job(job: dict, cache=None, tiers=None, timeout=DEFAULT_TIMEOUT,
+                      cpu_limit=None, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+                      quality_check=True) -> dict:
+    """
+    Run one job in a fresh, resource-limited child process.
+
+    The child is this script in --serve mode with the CPU and address-space
+    rlimits applied, started in its own session so that the job and anything
+    it spawns can be killed as a group. Returns the same result shape as
+    run_job, with "reason" explaining why the child failed, if it did.
+    """
+    start = time.perf_counter()
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--serve"]
+    if cache is None:
+        cmd.append("--no-cache")
+    else:
+        cmd += ["--cache-dir", str(cache.root),
+                "--cache-max-mb", str(max(1, cache.max_bytes // (1024 * 1024)))]
+    for tier in tiers or DEFAULT_TIERS:
+        cmd += ["--tier", tier]
+    if not quality_check:
+        cmd.append("--no-quality-check")
+    if cpu_limit:
+        cmd += ["--cpu-limit", str(cpu_limit)]
+    if memory_limit_mb:
+        cmd += ["--memory-limit-mb", str(memory_limit_mb)]
+
+    proc = subprocess.Popen(
+        cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True
+    )
+    request = (json.dumps(job, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        # Closing stdin makes the worker exit after this one job. Wait for
+        # the worker itself rather than for EOF on its stdout: processes the
+        # plot code started inherit that pipe and may hold it open.
+        try:
+            proc.stdin.write(request)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_process_group(proc)
+        proc.wait()
+        proc.stdout.close()
+        return _job_result(
+            job.get("id"),
+            error=f"Error: Plot code exceeded the {timeout:g}s wall-clock timeout.",
+            reason="timeout",
+            elapsed=round(time.perf_counter() - start, 3),
+        )
+    finally:
+        # Reap anything the plot code left running in the job's process group
+        _kill_process_group(proc)
+
+    out = _read_buffered(proc.stdout)
+    elapsed = round(time.perf_counter() - start, 3)
+    for line in out.decode("utf-8", errors="replace").splitlines():
+        if line.strip():
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            result["elapsed"] = elapsed
+            return result
+
+    rc = proc.returncode
+    if rc == -signal.SIGXCPU or (cpu_limit and rc == -signal.SIGKILL):
+        reason, message = "cpu_limit", f"Error: Plot code exceeded the {cpu_limit}s CPU-time limit."
+    elif rc is not None and rc < 0:
+        reason, message = "crashed", f"Error: Plot process was killed by {signal.Signals(-rc).name}."
+    else:
+        reason, message = "crashed", f"Error: Plot process exited with status {rc} and no result."
+    return _job_result(job.get("id"), error=message, reason=reason, elapsed=elapsed)
+
+
+def handle_request_line(line: str, runner=run_job) -> dict:
+    """Decode one JSON-lines request and run it."""
+    try:
+        job = json.loads(line)
+    except json.JSONDecodeError as e:
+        return _job_result(error=f"Invalid JSON request: {e}", reason="invalid_job")
+    if not isinstance(job, dict):
+        return _job_result(error="Request must be a JSON object", reason="invalid_job")
+    try:
+        return runner(job)
+    except Exception as e:
+        # One bad job must not take down a long-lived worker
+        return _job_result(job.get("id"), error=f"Error running job: {e}", reason="exception")
+
+
+def serve_stdin(runner=run_job):
+    """Serve JSON-lines jobs from stdin, writing one result line per job."""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        result = handle_request_line(line, runner)
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+class _PlotRequestHandler(socketserver.StreamRequestHandler):
+    """Answer every JSON line on a connection; jobs run one at a time."""
+
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8")
+            if not line.strip():
+                continue
+            result = handle_request_line(line, self.server.job_runner)
+            self.wfile.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+def serve_socket(socket_path: str, runner=run_job):
+    """Serve JSON-lines jobs on a Unix socket until interrupted."""
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        socket_path.unlink()
+    # matplotlib's global state is not thread-safe, so connections are
+    # handled sequentially by a plain (non-threading) server.
+    with socketserver.UnixStreamServer(str(socket_path), _PlotRequestHandler) as server:
+        server.job_runner = runner
+        print(f"Plot worker listening on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def state_changes(state, job: dict, result: dict) -> dict:
+    """State entries to record for a finished job (none without a state or state_key)."""
+    if state is None or not job.get("state_key") or not result.get("success"):
+        return {}
+    return state.output_keys(job["state_key"], image_path=result["path"],
+                             code_path=job.get("code_file"))
+
+
+def record_state(state, changes: dict):
+    """Apply state changes in one locked write; a failure is reported, not raised."""
+    if not changes:
+        return
+    try:
+        state.update(changes)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not update {state.path}: {e}", file=sys.stderr)
+
+
+def recording_runner(runner, state):
+    """Wrap a job runner so that each finished job is recorded in the state."""
+    def run(job):
+        result = runner(job)
+        record_state(state, state_changes(state, job, result))
+        return result
+    return run
+
+
+def load_batch_jobs(batch_arg: str, output_arg=None, suffix=".jpg") -> list:
+    """
+    Build the job list for --batch from a code directory or a JSON manifest.
+    Outputs of a directory batch get suffix (the first tier's).
+    """
+    batch_path = Path(batch_arg).resolve()
+    if batch_path.is_dir():
+        out_dir = Path(output_arg).resolve() if output_arg else Path.cwd() / "paper_banana_output"
+        jobs = []
+        for code_file in sorted(batch_path.glob("*.py")):
+            name = code_file.stem
+            if name.endswith("_code"):
+                name = name[: -len("_code")]
+            jobs.append({
+                "id": name,
+                "code_file": str(code_file),
+                "output": str(out_dir / f"{name}{suffix}"),
+            })
+        return jobs
+
+    jobs = json.loads(batch_path.read_text(encoding="utf-8"))
+    if not isinstance(jobs, list):
+        raise ValueError("Batch manifest must be a JSON list of job objects")
+    base_dir = batch_path.parent
+    for i, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            raise ValueError(f"Batch manifest entry {i} is not a JSON object")
+        job.setdefault("id", str(i))
+        for key in ("code_file", "output"):
+            if job.get(key):
+                job[key] = str(base_dir / job[key])
+    return jobs
+
+
+def run_batch(jobs: list, runner=run_job, max_workers=None, sandboxed=False) -> list:
+    """
+    Render jobs in parallel and return their results in job order.
+
+    Each pool process imports matplotlib once; results are streamed to
+    stdout as JSON lines as soon as each job finishes. Sandboxed runners
+    already start one child process per job, so they are driven from a
+    thread pool instead.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    results = [None] * len(jobs)
+    if sandboxed:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers, initializer=reset_matplotlib_state)
+    with executor as pool:
+        futures = {pool.submit(runner, job): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. killed by the OOM killer)
+                result = _job_result(jobs[i].get("id"), error=f"Worker process failed: {e}",
+                                     reason="crashed", elapsed=None)
+            results[i] = result
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+    return results
 
 
 def main():
     args = parse_args()
-    out_path = ensure_output_path(args.output)
+    cache = open_render_cache(args)
+
+    if args.sandbox:
+        runner = functools.partial(
+            run_sandboxed_job, cache=cache, tiers=args.tiers, timeout=args.timeout,
+            cpu_limit=args.cpu_limit, memory_limit_mb=args.memory_limit_mb,
+            quality_check=not args.no_quality_check,
+        )
+    else:
+        apply_resource_limits(args.cpu_limit, args.memory_limit_mb)
+        runner = functools.partial(run_job, cache=cache, tiers=args.tiers,
+                                   quality_check=not args.no_quality_check)
+
+    state = PipelineState(args.state) if args.state else None
+
+    if args.batch:
+        try:
+            jobs = load_batch_jobs(args.batch, args.output, RENDER_TIERS[args.tiers[0]]["suffix"])
+            if state is not None and Path(args.batch).is_dir():
+                task_type = state.get("task_type", "plot")
+                for job in jobs:
+                    job["state_key"] = f"target_{task_type}_{job['id']}"
+        except (OSError, ValueError) as e:
+            print(f"Error: Invalid batch input: {e}", file=sys.stderr)
+            sys.exit(1)
+        if not jobs:
+            print("Error: No plot jobs found in batch input.", file=sys.stderr)
+            sys.exit(1)
+        results = run_batch(jobs, runner, args.jobs, sandboxed=args.sandbox)
+        changes = {}
+        for job, result in zip(jobs, results):
+            changes.update(state_changes(state, job, result))
+        record_state(state, changes)
+        if args.results:
+            Path(args.results).write_text(
+                json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
+        if not all(r["success"] for r in results):
+            sys.exit(1)
+        return
+
+    if args.serve:
+        if not args.sandbox:
+            # Import matplotlib once up front so every job starts warm
+            reset_matplotlib_state()
+        if state is not None:
+            runner = recording_runner(runner, state)
+        if args.socket:
+            serve_socket(args.socket, runner)
+        else:
+            serve_stdin(runner)
+        return
+
+    out_path = ensure_output_path(args.output, RENDER_TIERS[args.tiers[0]]["suffix"])
+    try:
+        outputs = tier_output_paths(out_path, args.tiers)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
 
     # Read code from the specified source
     if args.code_file:
@@ -124,10 +886,22 @@ def main():
         print("Error: No code provided.", file=sys.stderr)
         sys.exit(1)
 
-    success = execute_and_save(code_text, out_path)
+    if args.sandbox:
+        result = runner({"code": code_text, "output": str(out_path)})
+        if not result["success"]:
+            print(f"{result['error']} (reason: {result['reason']})", file=sys.stderr)
+        success = result["success"]
+    else:
+        success = execute_and_save(code_text, out_path, cache, args.tiers,
+                                   quality_check=not args.no_quality_check)
     if success:
-        # Print absolute path to stdout for caller to capture
-        print(str(out_path.resolve()))
+        # Print absolute paths to stdout for caller to capture, first tier first
+        for path in outputs.values():
+            print(str(path.resolve()))
+        if args.state_key:
+            record_state(state, state.output_keys(
+                args.state_key, image_path=out_path, code_path=args.code_file
+            ))
     else:
         sys.exit(1)
 
@@ -11,24 +11,87 @@ Usage:
         [--model "gemini-2.0-flash-preview-image-generation"] \
         [--aspect-ratio "16:9"] \
         [--output PATH]
+
+Resident mode (one client and HTTP connection pool for the whole session):
+    python generate_diagram.py --serve
+
+    Each request is one JSON object per line on stdin:
+        {"id": "stylist_desc0", "description_file": "/abs/desc.txt",
+         "output": "/abs/out.jpg", "aspect_ratio": "16:9"}
+    ("description" may be given inline instead of "description_file"), and
+    is answered with one JSON object per line on stdout:
+        {"id": "stylist_desc0", "path": "/abs/out.jpg", "success": true, "error": null}
+
+Concurrent manifest mode (bounded parallelism, one shared client):
+    python generate_diagram.py --manifest jobs.json [--concurrency 4] [--results results.json]
+
+    The manifest is a JSON list of jobs in the resident-mode format. A job
+    with "samples": N is expanded into N jobs whose outputs are named
+    {stem}_s{i}{suffix}. Relative paths are resolved against the manifest's
+    directory. One JSON result line is printed per finished job.
+
+Response cache (opt-in with --cache or GEMINI_RESPONSE_CACHE=1):
+    Images are cached on disk keyed on the model, system instruction,
+    prompt, aspect ratio, image size and sample index, so re-running the
+    same jobs makes no API calls. Entries expire after --cache-ttl-days and
+    the least recently used are evicted past --cache-max-mb. --no-cache
+    bypasses the cache even when the environment enables it.
+
+Degenerate-output gate (see image_quality.py):
+    Every saved image is checked locally (histogram entropy, edge density,
+    share of non-background pixels). A blank, solid-colour or featureless
+    image is regenerated at once, up to --max-regenerations times, instead
+    of reaching a critic round; results carry the verdict in "quality" and
+    the retry count in "regenerated". If every attempt is degenerate the job
+    fails. --no-quality-check turns the gate off.
+
+Pipeline state (lock-protected, atomic updates; see pipeline_state.py):
+    python generate_diagram.py --description "..." --output /abs/images/desc0.jpg \
+        --state /abs/pipeline_state.json --state-key target_diagram_desc0
+
+    On success, {state-key}_image_path is set to the image path relative to
+    the state file's directory. In --serve and --manifest modes each job may
+    carry a "state_key" instead; a manifest run records all of its finished
+    jobs in a single state update (sample k of a job records {state_key}_s{k}).
+
+Library use:
+    from generate_diagram import generate_diagram_file
+    result = await generate_diagram_file("...", "/abs/out.jpg", aspect_ratio="16:9")
 """
 
 import argparse
 import asyncio
 import base64
 import io
+import json
 import os
 import sys
 import time
 
 from pathlib import Path
 
+from disk_cache import DEFAULT_CACHE_ROOT, DiskCache, make_key
+from pipeline_state import PipelineState
+from rate_limit import backoff_delay, get_limiter, is_retryable, retry_after_seconds
+
 DEFAULT_MODEL = "gemini-3-pro-image-preview"
 DEFAULT_ASPECT_RATIO = "1:1"
 DEFAULT_IMAGE_SIZE = "4K"
+DEFAULT_CONCURRENCY = 4
+DEFAULT_CACHE_MAX_MB = 1024
+DEFAULT_CACHE_TTL_DAYS = 30
+DEFAULT_MAX_REGENERATIONS = 2
+CACHE_ENV = "GEMINI_RESPONSE_CACHE"
 VALID_ASPECT_RATIOS = ["21:9", "16:9", "3:2", "1:1"]
 VALID_IMAGE_SIZES = ["1K", "2K", "4K"]
 
+# Output suffix -> (PIL format, mime type)
+OUTPUT_FORMATS = {
+    ".jpg": ("JPEG", "image/jpeg"),
+    ".jpeg": ("JPEG", "image/jpeg"),
+    ".png": ("PNG", "image/png"),
+}
+
 # Prompts preserved verbatim from visualizer_agent.py
 SYSTEM_INSTRUCTION = (
     "You are an expert scientific diagram illustrator. "
@@ -44,10 +107,19 @@ def parse_args():
     parser = argparse.ArgumentParser(
         description="Generate scientific diagrams via Gemini image generation API"
     )
-    parser.add_argument(
-        "--description", required=True,
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "--description",
         help="Detailed diagram description text"
     )
+    group.add_argument(
+        "--serve", action="store_true",
+        help="Run as a resident generator that reads JSON-lines jobs from stdin"
+    )
+    group.add_argument(
+        "--manifest",
+        help="JSON list of jobs to generate concurrently"
+    )
     parser.add_argument(
         "--model", default=DEFAULT_MODEL,
         help=f"Gemini model name (default: {DEFAULT_MODEL})"
@@ -66,7 +138,57 @@ def parse_args():
         "--output", default=None,
         help="Output file path (default: ./paper_banana_output/diagram_{timestamp}.jpg)"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"With --manifest, maximum requests in flight (default: {DEFAULT_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--results", default=None,
+        help="With --manifest, also write all job results to this JSON file"
+    )
+    parser.add_argument(
+        "--cache", action="store_true",
+        help=f"Reuse cached images for identical requests (also enabled by {CACHE_ENV}=1)"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Always call the API, even if the response cache is enabled"
+    )
+    parser.add_argument(
+        "--cache-dir", default=str(DEFAULT_CACHE_ROOT / "diagrams"),
+        help="Response cache directory (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_MB,
+        help=f"Response cache size cap in MB (default: {DEFAULT_CACHE_MAX_MB})"
+    )
+    parser.add_argument(
+        "--cache-ttl-days", type=float, default=DEFAULT_CACHE_TTL_DAYS,
+        help=f"Days before a cached image expires (default: {DEFAULT_CACHE_TTL_DAYS})"
+    )
+    parser.add_argument(
+        "--max-regenerations", type=int, default=DEFAULT_MAX_REGENERATIONS,
+        help="Times a degenerate (blank, solid-colour) image is regenerated "
+             f"before the job fails (default: {DEFAULT_MAX_REGENERATIONS})"
+    )
+    parser.add_argument(
+        "--no-quality-check", action="store_true",
+        help="Save images without the degenerate-output check"
+    )
+    parser.add_argument(
+        "--state", default=None,
+        help="pipeline_state.json to record generated image paths in"
+    )
+    parser.add_argument(
+        "--state-key", default=None,
+        help="With --description, the description key whose _image_path is recorded"
+    )
+    args = parser.parse_args()
+    if args.state_key and not (args.state and args.description):
+        parser.error("--state-key requires --state and --description")
+    if args.max_regenerations < 0:
+        parser.error("--max-regenerations must be 0 or more")
+    return args
 
 
 def ensure_output_path(output_arg):
@@ -82,32 +204,101 @@ def ensure_output_path(output_arg):
     return out_path
 
 
+def output_format_for(path: Path):
+    """(PIL format, mime type) to write for an output path, by suffix; JPEG by default."""
+    return OUTPUT_FORMATS.get(path.suffix.lower(), OUTPUT_FORMATS[".jpg"])
+
+
+def write_image(data: bytes, mime_type: str, out_path: Path):
+    """
+    Write raw image bytes from Gemini to out_path in the format its suffix asks for.
+
+    When the returned mime type already matches, the bytes are written as-is
+    with no decode. Otherwise the image is decoded once and re-encoded
+    straight into the output file (JPEG at quality 95, as in image_utils.py).
+    """
+    pil_format, wanted_mime = output_format_for(out_path)
+    if mime_type == wanted_mime:
+        out_path.write_bytes(data)
+        return
+
+    from PIL import Image as PILImage
+
+    with PILImage.open(io.BytesIO(data)) as img:
+        if pil_format == "JPEG" and img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(out_path, format=pil_format, quality=95)
+
+
 def convert_png_b64_to_jpg_bytes(png_b64_str: str) -> bytes:
     """
     Convert a base64-encoded PNG (from Gemini) to JPEG bytes.
     Logic from image_utils.py:24-46.
+
+    Kept for callers that hold base64 strings; generate_image now returns
+    raw bytes, which go straight to write_image.
     """
     from PIL import Image as PILImage
 
     raw_bytes = base64.b64decode(png_b64_str)
-    img = PILImage.open(io.BytesIO(raw_bytes)).convert("RGB")
-    out_io = io.BytesIO()
-    img.save(out_io, format="JPEG", quality=95)
+    with PILImage.open(io.BytesIO(raw_bytes)) as img:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        out_io = io.BytesIO()
+        img.save(out_io, format="JPEG", quality=95)
     return out_io.getvalue()
 
 
-async def generate_image(description: str, model: str, aspect_ratio: str, image_size: str = "1K", max_attempts: int = 5):
+def open_response_cache(args):
+    """Return the DiskCache selected by the command line and environment, or None."""
+    enabled = args.cache or os.environ.get(CACHE_ENV, "").lower() in ("1", "true", "yes")
+    if args.no_cache or not enabled:
+        return None
+    return DiskCache(
+        args.cache_dir,
+        max_bytes=args.cache_max_mb * 1024 * 1024,
+        ttl=args.cache_ttl_days * 86400,
+    )
+
+
+def response_cache_key(description: str, model: str, aspect_ratio: str, image_size: str,
+                       sample=None) -> str:
+    """Cache key for one image request; distinct samples of a job get distinct keys."""
+    return make_key(
+        "gemini-image", model, SYSTEM_INSTRUCTION, PROMPT_TEMPLATE.format(desc=description),
+        aspect_ratio, image_size, None, sample,
+    )
+
+
+def _pack_image(data: bytes, mime_type: str) -> bytes:
+    return mime_type.encode("ascii") + b"\n" + data
+
+
+def _unpack_image(entry: bytes):
+    mime_type, _, data = entry.partition(b"\n")
+    return data, mime_type.decode("ascii")
+
+
+# Process-wide client: reusing it keeps one HTTP connection pool (and its
+# TLS sessions) alive across every request made in this process.
+_client = None
+
+
+def get_client():
     """
-    Call Gemini image generation API with retry logic.
-    Extracted from generation_utils.py:100-182 and visualizer_agent.py:91-199.
+    Return the shared genai client, creating it on first use. Raises
+    RuntimeError when GOOGLE_API_KEY is not set.
     """
+    global _client
+    if _client is not None:
+        return _client
+
     from google import genai
     from google.genai import types
 
     api_key = os.environ.get("GOOGLE_API_KEY")
     if not api_key:
-        print("Error: GOOGLE_API_KEY environment variable is not set.", file=sys.stderr)
-        sys.exit(1)
+        raise RuntimeError("GOOGLE_API_KEY environment variable is not set.")
 
     base_url = os.environ.get("GOOGLE_API_BASE_URL")
     client_kwargs = {"api_key": api_key}
@@ -115,7 +306,34 @@ async def generate_image(description: str, model: str, aspect_ratio: str, image_
         client_kwargs["http_options"] = types.HttpOptions(base_url=base_url)
         print(f"Using custom base URL: {base_url}", file=sys.stderr)
 
-    client = genai.Client(**client_kwargs)
+    _client = genai.Client(**client_kwargs)
+    return _client
+
+
+async def close_client():
+    """Close the shared client's connection pools, if one was created."""
+    global _client
+    if _client is None:
+        return
+    await _client.aio.aclose()
+    _client.close()
+    _client = None
+
+
+async def generate_image(description: str, model: str, aspect_ratio: str, image_size: str = "1K",
+                         max_attempts: int = 5, client=None):
+    """
+    Call Gemini image generation API with retry logic.
+    Extracted from generation_utils.py:100-182 and visualizer_agent.py:91-199.
+
+    Returns (image_bytes, mime_type) as received, or None on failure.
+    Uses the shared client from get_client() unless one is passed in.
+    Every attempt takes a token from the shared rate limiter; failures back
+    off with jitter, or for as long as the server's retry hint asks.
+    """
+    from google.genai import types
+
+    client = client or get_client()
 
     prompt_text = PROMPT_TEMPLATE.format(desc=description)
 
@@ -131,8 +349,10 @@ async def generate_image(description: str, model: str, aspect_ratio: str, image_
         ),
     )
 
-    retry_delay = 5
+    limiter = get_limiter()
     for attempt in range(max_attempts):
+        last_attempt = attempt == max_attempts - 1
+        await limiter.acquire_async()
         try:
             response = await client.aio.models.generate_content(
                 model=model,
@@ -144,68 +364,336 @@ async def generate_image(description: str, model: str, aspect_ratio: str, image_
                 not response.candidates
                 or not response.candidates[0].content.parts
             ):
-                print(
-                    f"Warning: Empty response on attempt {attempt + 1}, "
-                    f"retrying in {retry_delay}s...",
-                    file=sys.stderr,
-                )
-                await asyncio.sleep(retry_delay)
-                continue
-
-            # Extract image data from response
-            for part in response.candidates[0].content.parts:
-                if part.inline_data:
-                    b64_data = base64.b64encode(part.inline_data.data).decode("utf-8")
-                    return b64_data
-
+                problem = "Empty response"
+            else:
+                # Extract image data from response
+                for part in response.candidates[0].content.parts:
+                    if part.inline_data:
+                        return part.inline_data.data, part.inline_data.mime_type
+                problem = "No image data in response"
+
+            if last_attempt:
+                print(f"Warning: {problem} on attempt {attempt + 1}.", file=sys.stderr)
+                break
+            delay = backoff_delay(attempt)
             print(
-                f"Warning: No image data in response on attempt {attempt + 1}, "
-                f"retrying in {retry_delay}s...",
+                f"Warning: {problem} on attempt {attempt + 1}, "
+                f"retrying in {delay:.1f}s...",
                 file=sys.stderr,
             )
-            await asyncio.sleep(retry_delay)
+            await asyncio.sleep(delay)
 
         except Exception as e:
-            current_delay = min(retry_delay * (2 ** attempt), 30)
+            if last_attempt or not is_retryable(e):
+                print(f"Attempt {attempt + 1}/{max_attempts} failed: {e}.", file=sys.stderr)
+                print(f"Error: Giving up after {attempt + 1} attempt(s).", file=sys.stderr)
+                return None
+
+            hint = retry_after_seconds(e)
+            if hint is not None:
+                # Pause every job sharing the limiter, not just this one
+                limiter.penalize(hint)
+                print(
+                    f"Attempt {attempt + 1}/{max_attempts} failed: {e}. "
+                    f"Server asked to retry in {hint:g}s...",
+                    file=sys.stderr,
+                )
+                continue
+
+            delay = backoff_delay(attempt)
             print(
                 f"Attempt {attempt + 1}/{max_attempts} failed: {e}. "
-                f"Retrying in {current_delay}s...",
+                f"Retrying in {delay:.1f}s...",
                 file=sys.stderr,
             )
-            if attempt < max_attempts - 1:
-                await asyncio.sleep(current_delay)
-            else:
-                print(f"Error: All {max_attempts} attempts failed.", file=sys.stderr)
-                return None
+            await asyncio.sleep(delay)
 
     return None
 
 
-async def main_async():
-    args = parse_args()
-    out_path = ensure_output_path(args.output)
+async def generate_diagram_file(description: str, output_path=None, model: str = DEFAULT_MODEL,
+                                aspect_ratio: str = DEFAULT_ASPECT_RATIO,
+                                image_size: str = DEFAULT_IMAGE_SIZE, client=None,
+                                cache=None, sample=None,
+                                max_regenerations=DEFAULT_MAX_REGENERATIONS) -> dict:
+    """
+    Generate one diagram and save it as JPEG (or PNG for a .png output path).
+
+    Library entry point: repeated calls share one client and connection
+    pool. With a DiskCache, an identical earlier request (same `sample`
+    index, if any) is served from disk without calling the API.
+
+    Each saved image goes through image_quality.assess; a degenerate one is
+    requested again (bypassing the cache) up to max_regenerations times.
+    A rejected image is deleted, so a failed job leaves no file at the
+    output path. Only images that pass are cached. max_regenerations=None
+    skips the check. Returns a dict with 'success', 'path', 'error', 'cached',
+    'quality' (the verdict, or None) and 'regenerated'.
+    """
+    out_path = ensure_output_path(output_path)
+    result = {"success": False, "path": None, "error": None, "cached": False,
+              "quality": None, "regenerated": 0}
+
+    key = response_cache_key(description, model, aspect_ratio, image_size, sample)
+    entry = cache.get(key) if cache is not None else None
+    while True:
+        result["cached"] = entry is not None
+        if entry is not None:
+            image = _unpack_image(entry)
+        else:
+            try:
+                image = await generate_image(
+                    description=description,
+                    model=model,
+                    aspect_ratio=aspect_ratio,
+                    image_size=image_size,
+                    client=client,
+                )
+            except RuntimeError as e:
+                result["error"] = str(e)
+                return result
+            if not image:
+                result["error"] = "Failed to generate image."
+                return result
+
+        # Convert (only if needed) and save, off the event loop so that
+        # concurrent jobs keep making progress during the encode
+        data, mime_type = image
+        try:
+            await asyncio.to_thread(write_image, data, mime_type, out_path)
+        except Exception as e:
+            result["error"] = f"Could not convert image: {e}"
+            return result
+
+        if max_regenerations is not None:
+            from image_quality import assess
+
+            quality = await asyncio.to_thread(assess, out_path, aspect_ratio)
+            result["quality"] = quality
+            if not quality["ok"]:
+                out_path.unlink(missing_ok=True)
+                issues = ", ".join(quality["issues"])
+                if result["regenerated"] >= max_regenerations:
+                    result["error"] = f"Degenerate image ({issues})."
+                    return result
+                result["regenerated"] += 1
+                print(f"Warning: Degenerate image ({issues}), regenerating "
+                      f"({result['regenerated']}/{max_regenerations})...", file=sys.stderr)
+                entry = None
+                continue
+
+        if cache is not None and entry is None:
+            await asyncio.to_thread(cache.put, key, _pack_image(data, mime_type))
+        result.update(success=True, path=str(out_path.resolve()))
+        return result
+
+
+async def run_job(job: dict, defaults=None, cache=None) -> dict:
+    """
+    Run one JSON job and return its JSON-serialisable result.
 
-    b64_image = await generate_image(
-        description=args.description,
-        model=args.model,
-        aspect_ratio=args.aspect_ratio,
-        image_size=args.image_size,
+    A job carries "description" or "description_file", plus optional
+    "output", "model", "aspect_ratio", "image_size", "max_regenerations",
+    "sample" (set by manifest expansion) and an "id" that is echoed back.
+    Missing settings fall back to defaults, then the module defaults.
+    """
+    settings = {
+        "model": DEFAULT_MODEL,
+        "aspect_ratio": DEFAULT_ASPECT_RATIO,
+        "image_size": DEFAULT_IMAGE_SIZE,
+        "max_regenerations": DEFAULT_MAX_REGENERATIONS,
+    }
+    settings.update(defaults or {})
+    settings.update({k: job[k] for k in settings if job.get(k) is not None})
+    result = {"id": job.get("id"), "path": None, "success": False, "error": None, "cached": False}
+
+    if job.get("description_file"):
+        desc_file = Path(job["description_file"])
+        if not desc_file.exists():
+            result["error"] = f"File not found: {desc_file}"
+            return result
+        try:
+            description = desc_file.read_text(encoding="utf-8")
+        except (OSError, ValueError) as e:
+            result["error"] = f"Could not read description file: {e}"
+            return result
+    else:
+        description = job.get("description") or ""
+    if not description.strip():
+        result["error"] = "No description provided."
+        return result
+    if settings["aspect_ratio"] not in VALID_ASPECT_RATIOS:
+        result["error"] = f"Invalid aspect ratio: {settings['aspect_ratio']}"
+        return result
+    if settings["image_size"] not in VALID_IMAGE_SIZES:
+        result["error"] = f"Invalid image size: {settings['image_size']}"
+        return result
+
+    outcome = await generate_diagram_file(
+        description, job.get("output"), cache=cache, sample=job.get("sample"), **settings
     )
+    result.update(outcome)
+    return result
 
-    if not b64_image:
-        print("Error: Failed to generate image.", file=sys.stderr)
-        sys.exit(1)
 
-    # Convert to JPEG and save
+def state_changes(state, job: dict, result: dict) -> dict:
+    """State entries to record for a finished job (none without a state or state_key)."""
+    if state is None or not job.get("state_key") or not result.get("success"):
+        return {}
+    return state.output_keys(job["state_key"], image_path=result["path"])
+
+
+def record_state(state, changes: dict):
+    """Apply state changes in one locked write; a failure is reported, not raised."""
+    if not changes:
+        return
+    try:
+        state.update(changes)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not update {state.path}: {e}", file=sys.stderr)
+
+
+def _decode_job(line: str):
+    """Parse one JSON-lines request; returns (job, error_message)."""
+    try:
+        job = json.loads(line)
+    except json.JSONDecodeError as e:
+        return None, f"Invalid JSON request: {e}"
+    if not isinstance(job, dict):
+        return None, "Request must be a JSON object"
+    return job, None
+
+
+async def serve_stdin(defaults=None, cache=None, state=None):
+    """Serve JSON-lines jobs from stdin with one shared client."""
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        if not line.strip():
+            continue
+        job, error = _decode_job(line)
+        if error:
+            result = {"id": None, "path": None, "success": False, "error": error}
+        else:
+            # One bad job must not end the session
+            try:
+                result = await run_job(job, defaults, cache)
+            except Exception as e:
+                result = {"id": job.get("id"), "path": None, "success": False, "error": str(e)}
+            await asyncio.to_thread(record_state, state, state_changes(state, job, result))
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+def load_manifest(manifest_arg: str) -> list:
+    """Read a job manifest, resolving paths and expanding "samples"."""
+    manifest_path = Path(manifest_arg).resolve()
+    entries = json.loads(manifest_path.read_text(encoding="utf-8"))
+    if not isinstance(entries, list):
+        raise ValueError("Manifest must be a JSON list of job objects")
+
+    base_dir = manifest_path.parent
+    jobs = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Manifest entry {i} is not a JSON object")
+        job = dict(entry)
+        job.setdefault("id", str(i))
+        for key in ("description_file", "output"):
+            if job.get(key):
+                job[key] = str(base_dir / job[key])
+
+        samples = int(job.pop("samples", 1) or 1)
+        if samples == 1:
+            jobs.append(job)
+            continue
+        if not job.get("output"):
+            raise ValueError(f"Manifest entry {i} needs an output path to expand samples")
+        out = Path(job["output"])
+        for k in range(samples):
+            jobs.append(dict(
+                job,
+                id=f"{job['id']}_s{k}",
+                sample=k,
+                **({"state_key": f"{job['state_key']}_s{k}"} if job.get("state_key") else {}),
+                output=str(out.with_name(f"{out.stem}_s{k}{out.suffix}")),
+            ))
+    return jobs
+
+
+async def run_manifest(jobs: list, concurrency: int = DEFAULT_CONCURRENCY, defaults=None,
+                       cache=None, state=None) -> list:
+    """
+    Run jobs concurrently, at most `concurrency` requests in flight.
+
+    Results are streamed to stdout as JSON lines as jobs finish and are
+    returned in job order. With a PipelineState, the image paths of all
+    successful jobs that carry a "state_key" are recorded in one update.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(job):
+        async with semaphore:
+            try:
+                result = await run_job(job, defaults, cache)
+            except Exception as e:
+                result = {"id": job.get("id"), "path": None, "success": False, "error": str(e)}
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+        return result
+
+    results = await asyncio.gather(*(run_one(job) for job in jobs))
+    changes = {}
+    for job, result in zip(jobs, results):
+        changes.update(state_changes(state, job, result))
+    record_state(state, changes)
+    return results
+
+
+async def main_async():
+    args = parse_args()
+    defaults = {
+        "model": args.model,
+        "aspect_ratio": args.aspect_ratio,
+        "image_size": args.image_size,
+        "max_regenerations": None if args.no_quality_check else args.max_regenerations,
+    }
+    cache = open_response_cache(args)
+    state = PipelineState(args.state) if args.state else None
+
     try:
-        jpg_bytes = convert_png_b64_to_jpg_bytes(b64_image)
-    except Exception as e:
-        print(f"Error converting image: {e}", file=sys.stderr)
+        if args.serve:
+            await serve_stdin(defaults, cache, state)
+            return
+
+        if args.manifest:
+            try:
+                jobs = load_manifest(args.manifest)
+            except (OSError, ValueError) as e:
+                print(f"Error: Invalid manifest: {e}", file=sys.stderr)
+                sys.exit(1)
+            results = await run_manifest(jobs, args.concurrency, defaults, cache, state)
+            if args.results:
+                Path(args.results).write_text(
+                    json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8"
+                )
+            if not all(r["success"] for r in results):
+                sys.exit(1)
+            return
+
+        result = await generate_diagram_file(args.description, args.output, cache=cache, **defaults)
+    finally:
+        await close_client()
+
+    if not result["success"]:
+        print(f"Error: {result['error']}", file=sys.stderr)
         sys.exit(1)
+    record_state(state, state_changes(state, {"state_key": args.state_key}, result))
 
-    out_path.write_bytes(jpg_bytes)
     # Print absolute path to stdout for caller to capture
-    print(str(out_path.resolve()))
+    print(result["path"])
 
 
 def main():
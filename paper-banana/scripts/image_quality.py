@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+PaperBanana Image Quality - Cheap Local Checks on Generated Figures
+
+A critic round costs a multi-second model call, so candidates are screened
+locally first. Each image is decoded once at a reduced size (JPEG draft
+mode) to greyscale and checked for:
+
+    unreadable      the file cannot be decoded
+    too_small       either side is under MIN_SIDE pixels
+    blank           almost no pixel differs from the background colour
+    low_entropy     the grey-level histogram is nearly a single spike
+                    (solid or near-solid colour)
+    no_edges        almost no sharp transitions, so nothing is drawn
+                    (flat fills, soft gradients)
+    edge_clipping   content runs into the outer border (labels or elements cut off)
+    aspect_ratio    far from the requested aspect ratio, or extremely elongated
+                    (typical of text overflowing a tight bounding box)
+
+All but the last two mark the image as degenerate (ok: false); those two
+only lower its rank. The background is the median grey level of the
+outermost pixel ring, and a pixel counts as ink when it differs from it by
+more than INK_DELTA levels. Entropy is taken over the 256-bin grey-level
+histogram, in bits; edge density is the share of pixels whose difference
+to the right or lower neighbour exceeds EDGE_DELTA levels.
+
+Usage:
+    python image_quality.py IMAGE [IMAGE ...] [--aspect-ratio 16:9]
+
+    One JSON object is printed per image:
+        {"path": "...", "ok": true, "issues": [], "penalty": 0.0, "metrics": {...}}
+    The exit code is 1 if any image failed.
+
+Library use:
+    from image_quality import assess, rank
+    ranked = rank([assess(p, aspect_ratio="16:9") for p in paths])
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from PIL import Image
+
+ANALYSIS_SIZE = 512
+MIN_SIDE = 64
+INK_DELTA = 24
+MIN_INK_RATIO = 0.002
+MIN_ENTROPY = 0.05
+EDGE_DELTA = 32
+MIN_EDGE_DENSITY = 0.0005
+MAX_BORDER_INK = 0.02
+MAX_ELONGATION = 4.0
+ASPECT_TOLERANCE = 0.15
+
+HARD_ISSUES = ("unreadable", "too_small", "blank", "low_entropy", "no_edges")
+
+
+def parse_aspect_ratio(value):
+    """'16:9' -> 1.777...; None passes through."""
+    if value is None:
+        return None
+    width, _, height = str(value).partition(":")
+    return float(width) / float(height or 1)
+
+
+def load_gray(path, size=ANALYSIS_SIZE):
+    """
+    Decode path to a greyscale array no larger than size x size; returns
+    (array, (width, height)) with the original dimensions. Transparent
+    areas are composited onto white.
+    """
+    with Image.open(path) as img:
+        original = img.size
+        img.draft("L", (size, size))
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            img = img.convert("RGBA")
+            background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(background, img)
+        img = img.convert("L")
+        img.thumbnail((size, size), Image.BILINEAR)
+        return np.asarray(img), original
+
+
+def _border(gray: np.ndarray) -> np.ndarray:
+    return np.concatenate([gray[0], gray[-1], gray[1:-1, 0], gray[1:-1, -1]])
+
+
+def entropy(gray: np.ndarray) -> float:
+    """Shannon entropy of the grey-level histogram, in bits (0 to 8)."""
+    p = np.bincount(gray.ravel(), minlength=256) / gray.size
+    p = p[p > 0]
+    return max(0.0, float(-(p * np.log2(p)).sum()))
+
+
+def edge_density(gray: np.ndarray) -> float:
+    """Share of pixels with a sharp step to their right or lower neighbour."""
+    signed = gray.astype(np.int16)
+    edges = np.zeros(gray.shape, dtype=bool)
+    edges[:, :-1] |= np.abs(np.diff(signed, axis=1)) > EDGE_DELTA
+    edges[:-1, :] |= np.abs(np.diff(signed, axis=0)) > EDGE_DELTA
+    return float(edges.mean())
+
+
+def measure(gray: np.ndarray) -> dict:
+    """Pixel statistics used by the checks."""
+    border = _border(gray)
+    background = float(np.median(border))
+    ink = np.abs(gray.astype(np.int16) - int(background)) > INK_DELTA
+    return {
+        "background": round(background, 1),
+        "ink_ratio": round(float(ink.mean()), 5),
+        "border_ink": round(float(_border(ink).mean()), 5),
+        "entropy": round(entropy(gray), 4),
+        "edge_density": round(edge_density(gray), 5),
+    }
+
+
+def assess(path, aspect_ratio=None) -> dict:
+    """Run every check on one image and return a JSON-serialisable verdict."""
+    path = str(path)
+    result = {"path": path, "ok": False, "issues": [], "penalty": 0.0, "metrics": {}}
+    try:
+        gray, (width, height) = load_gray(path)
+        result["metrics"] = {"width": width, "height": height,
+                             "bytes": os.path.getsize(path), **measure(gray)}
+    except (OSError, ValueError) as e:
+        result["issues"].append("unreadable")
+        result["error"] = str(e)
+        return result
+
+    metrics, issues = result["metrics"], result["issues"]
+    if min(width, height) < MIN_SIDE:
+        issues.append("too_small")
+    if metrics["ink_ratio"] < MIN_INK_RATIO:
+        issues.append("blank")
+    if metrics["entropy"] < MIN_ENTROPY:
+        issues.append("low_entropy")
+    if metrics["edge_density"] < MIN_EDGE_DENSITY:
+        issues.append("no_edges")
+    if metrics["border_ink"] > MAX_BORDER_INK:
+        issues.append("edge_clipping")
+
+    actual = width / height
+    expected = parse_aspect_ratio(aspect_ratio)
+    if expected is not None:
+        off_ratio = abs(np.log(actual / expected)) > np.log1p(ASPECT_TOLERANCE)
+    else:
+        off_ratio = max(actual, 1 / actual) > MAX_ELONGATION
+    if off_ratio:
+        issues.append("aspect_ratio")
+
+    result["ok"] = not any(issue in HARD_ISSUES for issue in issues)
+    result["penalty"] = round(len(issues) + metrics["border_ink"], 5)
+    return result
+
+
+def rank(assessments: list) -> list:
+    """Passing images first, then by penalty; ties keep their original order."""
+    order = sorted(range(len(assessments)),
+                   key=lambda i: (not assessments[i]["ok"], assessments[i]["penalty"], i))
+    return [assessments[i] for i in order]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cheap local quality checks on generated images")
+    parser.add_argument("images", nargs="+", help="Image files to check")
+    parser.add_argument("--aspect-ratio", default=None,
+                        help="Expected aspect ratio, e.g. 16:9 (default: only reject extremes)")
+    args = parser.parse_args()
+
+    try:
+        parse_aspect_ratio(args.aspect_ratio)
+    except (ValueError, ZeroDivisionError):
+        parser.error(f"invalid aspect ratio: {args.aspect_ratio}")
+
+    failed = False
+    for path in args.images:
+        result = assess(path, args.aspect_ratio)
+        failed = failed or not result["ok"]
+        print(json.dumps(result, ensure_ascii=False))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
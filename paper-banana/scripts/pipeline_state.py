@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+PaperBanana Pipeline State - Atomic, Lock-Protected pipeline_state.json Updates
+
+Sub-agents and scripts used to read the whole pipeline_state.json, change
+it and write it back, so two visualizer jobs finishing together could drop
+each other's keys. Every change here is a read-modify-write under an
+exclusive lock on a sidecar lock file ({state}.lock), and the new state is
+written to a temporary file and renamed over the old one, so readers never
+see a partial file and concurrent writers never lose updates. Any number
+of keys can be changed in one locked write.
+
+Usage:
+    python pipeline_state.py STATE get [KEY ...]
+    python pipeline_state.py STATE set KEY VALUE [KEY VALUE ...] [--json]
+    python pipeline_state.py STATE update '{"key": "value", ...}'
+    python pipeline_state.py STATE update @changes.json
+    python pipeline_state.py STATE delete KEY [KEY ...]
+
+    get prints the whole state, or the value of each KEY (one JSON value per
+    line). set stores VALUEs as strings; with --json each VALUE is parsed as
+    JSON. update merges a JSON object (inline or from @file) into the state.
+
+Library use:
+    from pipeline_state import PipelineState
+    state = PipelineState("/abs/output/pipeline_state.json")
+    state.update({"target_diagram_desc0_image_path": "images/desc0.jpg"})
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# The umask can only be read by setting it; do that once, at import
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class PipelineState:
+    """pipeline_state.json with locked, atomically replaced updates."""
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, path):
+        self.path = Path(path).resolve()
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        with self._locks_guard:
+            self._thread_lock = self._locks.setdefault(self.path, threading.Lock())
+
+    # -- reading -----------------------------------------------------------
+
+    def read(self) -> dict:
+        """Return the current state ({} if the file does not exist yet)."""
+        try:
+            text = self.path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return {}
+        state = json.loads(text or "{}")
+        if not isinstance(state, dict):
+            raise ValueError(f"{self.path} does not contain a JSON object")
+        return state
+
+    def get(self, key, default=None):
+        return self.read().get(key, default)
+
+    # -- writing -----------------------------------------------------------
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _file_mode(self) -> int:
+        """Permissions for the new file: the current file's, else 0666 minus the umask."""
+        try:
+            return self.path.stat().st_mode & 0o777
+        except FileNotFoundError:
+            return 0o666 & ~_UMASK
+
+    def _write(self, state: dict):
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.",
+                                   suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp creates the file 0600; keep the state readable as before
+            os.chmod(tmp, self._file_mode())
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yield the current state for in-place changes; it is written back when
+        the block exits without an exception. Other writers wait meanwhile.
+        """
+        with self._locked():
+            state = self.read()
+            yield state
+            self._write(state)
+
+    def update(self, changes=None, delete=()) -> dict:
+        """Set every key in `changes` and remove every key in `delete` in one write."""
+        with self.transaction() as state:
+            state.update(changes or {})
+            for key in delete:
+                state.pop(key, None)
+            return dict(state)
+
+    def set(self, key, value) -> dict:
+        return self.update({key: value})
+
+    def delete(self, *keys) -> dict:
+        return self.update(delete=keys)
+
+    # -- paths -------------------------------------------------------------
+
+    def relative(self, path) -> str:
+        """Path relative to the state file's directory (the pipeline output_dir)."""
+        return Path(os.path.relpath(Path(path).resolve(), self.path.parent)).as_posix()
+
+    def output_keys(self, desc_key: str, image_path=None, code_path=None) -> dict:
+        """The {desc_key}_image_path / {desc_key}_code entries for generated files."""
+        changes = {}
+        if image_path:
+            changes[f"{desc_key}_image_path"] = self.relative(image_path)
+        if code_path:
+            changes[f"{desc_key}_code"] = self.relative(code_path)
+        return changes
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Read and update pipeline_state.json")
+    parser.add_argument("state", help="Path to pipeline_state.json")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    get = sub.add_parser("get", help="Print the state or selected keys")
+    get.add_argument("keys", nargs="*")
+
+    set_ = sub.add_parser("set", help="Set one or more keys")
+    set_.add_argument("pairs", nargs="+", metavar="KEY VALUE")
+    set_.add_argument("--json", action="store_true", help="Parse each VALUE as JSON")
+
+    update = sub.add_parser("update", help="Merge a JSON object into the state")
+    update.add_argument("changes", help="JSON object, or @file containing one")
+
+    delete = sub.add_parser("delete", help="Remove keys")
+    delete.add_argument("keys", nargs="+")
+
+    args = parser.parse_args()
+    if args.command == "set" and len(args.pairs) % 2:
+        parser.error("set expects KEY VALUE pairs")
+    return args
+
+
+def main():
+    args = parse_args()
+    state = PipelineState(args.state)
+
+    try:
+        if args.command == "get":
+            current = state.read()
+            if not args.keys:
+                print(json.dumps(current, ensure_ascii=False, indent=2))
+            for key in args.keys:
+                print(json.dumps(current.get(key), ensure_ascii=False))
+            return
+
+        if args.command == "delete":
+            state.delete(*args.keys)
+            return
+
+        if args.command == "set":
+            pairs = zip(args.pairs[::2], args.pairs[1::2])
+            changes = {k: json.loads(v) if args.json else v for k, v in pairs}
+        elif args.command == "update":
+            text = args.changes
+            if text.startswith("@"):
+                text = Path(text[1:]).read_text(encoding="utf-8")
+            changes = json.loads(text)
+            if not isinstance(changes, dict):
+                raise ValueError("update expects a JSON object")
+        state.update(changes)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Gemini Rate Limiter - Shared Token Bucket and Retry Scheduling
+
+Client-side rate limiting for the Gemini image generators. A token bucket
+caps the request rate, and a shared cooldown makes every job pause when any
+job is told to back off, instead of all of them retrying in lockstep.
+
+Bucket state lives in a small JSON file guarded by an exclusive file lock,
+so every generator process on the host draws from the same bucket; within
+a process, a threading lock serialises access. The same module is shipped
+with each plugin and uses the same state file by default, so the
+paper-banana and patent-writer generators also coordinate with each other.
+
+Environment:
+    GEMINI_RATE_LIMIT_RPM     Requests per minute (default: 30)
+    GEMINI_RATE_LIMIT_BURST   Bucket size (default: 10)
+    GEMINI_RATE_LIMIT_STATE   State file (default: ~/.cache/gemini-rate-limit/state.json);
+                              set to an empty string to keep state in-process only
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process coordination only
+    fcntl = None
+
+DEFAULT_RPM = 30
+DEFAULT_BURST = 10
+DEFAULT_STATE_PATH = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    / "gemini-rate-limit" / "state.json"
+)
+
+# HTTP status codes worth retrying; other 4xx errors will fail again
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket with a shared cooldown, optionally backed by a state file."""
+
+    def __init__(self, rpm: float = DEFAULT_RPM, burst: int = DEFAULT_BURST, state_path=None):
+        self.rate = max(rpm, 0.001) / 60.0
+        self.burst = max(1, burst)
+        self.state_path = Path(state_path) if state_path else None
+        self._lock = threading.Lock()
+        self._memory_state = None
+
+    # -- state -------------------------------------------------------------
+
+    def _update(self, fn):
+        """Apply fn(state, now) -> result under both locks and persist the state."""
+        with self._lock:
+            now = time.time()
+            if self.state_path is None or fcntl is None:
+                if self._memory_state is None:
+                    self._memory_state = self._fresh_state(now)
+                return fn(self._memory_state, now)
+
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.state_path, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or "null")
+                    except json.JSONDecodeError:
+                        state = None
+                    if not isinstance(state, dict):
+                        state = self._fresh_state(now)
+                    result = fn(state, now)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                    return result
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _fresh_state(self, now):
+        return {"tokens": float(self.burst), "updated": now, "blocked_until": 0.0}
+
+    def _reserve(self, state, now):
+        """Take a token if one is free; otherwise return seconds to wait."""
+        elapsed = max(0.0, now - state.get("updated", now))
+        tokens = min(float(self.burst), state.get("tokens", self.burst) + elapsed * self.rate)
+        state["tokens"] = tokens
+        state["updated"] = now
+
+        blocked_until = state.get("blocked_until", 0.0)
+        if now < blocked_until:
+            return blocked_until - now
+        if tokens >= 1.0:
+            state["tokens"] = tokens - 1.0
+            return 0.0
+        return (1.0 - tokens) / self.rate
+
+    def reserve(self) -> float:
+        """Try to take a token; return 0 on success or the seconds to wait."""
+        wait = self._update(self._reserve)
+        # Spread out waiters that woke up for the same refill or cooldown
+        return wait * random.uniform(1.0, 1.25) if wait > 0 else 0.0
+
+    def penalize(self, delay: float):
+        """Make every job sharing this limiter pause for `delay` seconds."""
+        def block(state, now):
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), now + delay)
+        self._update(block)
+
+    # -- acquiring ---------------------------------------------------------
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait (without blocking the event loop) until a request may be sent."""
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide limiter configured from the environment."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            state = os.environ.get("GEMINI_RATE_LIMIT_STATE")
+            if state is None:
+                state = DEFAULT_STATE_PATH
+            _limiter = RateLimiter(
+                rpm=float(os.environ.get("GEMINI_RATE_LIMIT_RPM") or DEFAULT_RPM),
+                burst=int(os.environ.get("GEMINI_RATE_LIMIT_BURST") or DEFAULT_BURST),
+                state_path=state or None,
+            )
+        return _limiter
+
+
+# ---------------------------------------------------------------------------
+# Retry scheduling
+# ---------------------------------------------------------------------------
+
+def backoff_delay(attempt: int, base: float = 2.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for the given 0-based attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _parse_duration(value):
+    """Parse '12s', '1.5s' or '12' into seconds; None if unparseable."""
+    if value is None:
+        return None
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*s?\s*", str(value))
+    return float(match.group(1)) if match else None
+
+
+def retry_after_seconds(exc):
+    """
+    Extract a server retry hint from an API error, if it carries one.
+
+    Looks at a Retry-After response header, then at google.rpc.RetryInfo
+    details in the error body, then at a retryDelay mentioned in the text.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            delay = _parse_duration(headers.get("retry-after"))
+        except Exception:
+            delay = None
+        if delay is not None:
+            return delay
+
+    details = getattr(exc, "details", None)
+    if isinstance(details, dict):
+        error = details.get("error", details)
+        for item in error.get("details", []) if isinstance(error, dict) else []:
+            if isinstance(item, dict) and "retryDelay" in item:
+                delay = _parse_duration(item["retryDelay"])
+                if delay is not None:
+                    return delay
+
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(exc))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def is_retryable(exc) -> bool:
+    """False for API errors that will fail the same way again (bad request, auth, safety)."""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and 400 <= code < 600:
+        return code in RETRYABLE_STATUS
+    return True
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+PaperBanana Reference Index - Offline BM25 Index over PaperBananaBench ref.json
+
+The retriever's auto mode used to paste a fixed slice of ref.json (the first
+200 diagrams) into a model prompt for every figure. This script builds a
+lexical BM25 index over every candidate once, so the retriever can shortlist
+the most similar candidates from the whole pool in a few milliseconds and
+send only that shortlist to the model.
+
+Each candidate is indexed on its content (methodology section / raw data)
+and its visual_intent (caption / plot intent); visual_intent terms count
+INTENT_WEIGHT times, since the caption says most about the figure type.
+The index is a term-major sparse matrix of precomputed BM25 weights, saved
+as plain .npy arrays that queries open with mmap, so a query only touches
+the postings of its own terms:
+
+    {index_dir}/meta.json    version, BM25 parameters, source ref.json size/mtime
+    {index_dir}/terms.npy    sorted vocabulary (fixed-width unicode)
+    {index_dir}/indptr.npy   postings offsets per term (int64, len(terms) + 1)
+    {index_dir}/docs.npy     candidate row of each posting (int32)
+    {index_dir}/weights.npy  BM25 weight of each posting (float32)
+    {index_dir}/ids.npy      candidate IDs in ref.json order
+
+The default index_dir is {ref.json dir}/ref_index/. A query rebuilds the
+index first when it is missing or ref.json has changed since it was built.
+
+Usage:
+    python ref_index.py build data/PaperBananaBench/diagram/ref.json
+    python ref_index.py query data/PaperBananaBench/diagram/ref.json \
+        --state /abs/output/pipeline_state.json --top-k 50
+    python ref_index.py query data/PaperBananaBench/plot/ref.json \
+        --visual-intent "Grouped bar chart of ..." --content @raw_data.txt
+
+    query reads content and visual_intent from the pipeline state, or from
+    --content / --visual-intent (TEXT, or @file). It prints one JSON object:
+        {"ids": ["ref_12", ...], "scores": [18.4, ...], "pool_size": 1200}
+    Candidates sharing no term with the query are never returned.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+INDEX_VERSION = 1
+INDEX_DIRNAME = "ref_index"
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# visual_intent terms count this many times, in candidates and in queries
+INTENT_WEIGHT = 2
+
+MAX_TOKEN_LENGTH = 32
+TOKEN_RE = re.compile(r"[a-z][a-z0-9]+")
+STOPWORDS = frozenset("""
+    a an and are as at be been but by can do does for from has have how in into
+    is it its it's of on or our such than that the their then there these they
+    this those through to under via was we were what when where which while
+    who will with within without you your also each both more most other same
+    so only over about after before between during all any some not no using
+    used use based
+""".split())
+
+
+def tokenize(value) -> list:
+    """Lowercase word tokens; non-string values (raw plot data) are JSON-encoded first."""
+    if value is None:
+        return []
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False)
+    return [t for t in TOKEN_RE.findall(value.lower())
+            if t not in STOPWORDS and len(t) <= MAX_TOKEN_LENGTH]
+
+
+def term_counts(content, visual_intent) -> Counter:
+    counts = Counter(tokenize(content))
+    for term, n in Counter(tokenize(visual_intent)).items():
+        counts[term] += INTENT_WEIGHT * n
+    return counts
+
+
+def default_index_dir(ref_path) -> Path:
+    return Path(ref_path).resolve().parent / INDEX_DIRNAME
+
+
+def source_signature(ref_path) -> dict:
+    st = os.stat(ref_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+# ---------------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------------
+
+def build_arrays(items: list) -> dict:
+    """BM25 posting arrays for a list of ref.json items."""
+    ids, lengths, doc_terms = [], [], []
+    for row, item in enumerate(items):
+        ids.append(str(item.get("id", f"ref_{row}")))
+        counts = term_counts(item.get("content"), item.get("visual_intent"))
+        lengths.append(sum(counts.values()))
+        doc_terms.append(counts)
+
+    terms = sorted({term for counts in doc_terms for term in counts})
+    column = {term: i for i, term in enumerate(terms)}
+
+    n_postings = sum(len(counts) for counts in doc_terms)
+    post_term = np.empty(n_postings, dtype=np.int32)
+    post_doc = np.empty(n_postings, dtype=np.int32)
+    post_tf = np.empty(n_postings, dtype=np.float32)
+    i = 0
+    for row, counts in enumerate(doc_terms):
+        for term, n in counts.items():
+            post_term[i], post_doc[i], post_tf[i] = column[term], row, n
+            i += 1
+
+    # Term-major order; the stable sort keeps candidate rows ascending per term
+    order = np.argsort(post_term, kind="stable")
+    post_term, post_doc, post_tf = post_term[order], post_doc[order], post_tf[order]
+
+    df = np.bincount(post_term, minlength=len(terms))
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(df, out=indptr[1:])
+
+    n_docs = len(items)
+    doc_len = np.asarray(lengths, dtype=np.float32)
+    avgdl = float(doc_len.mean()) if n_docs else 0.0
+    avgdl = avgdl or 1.0
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+    norm = K1 * (1 - B + B * doc_len[post_doc] / avgdl)
+    weights = idf[post_term] * post_tf * (K1 + 1) / (post_tf + norm)
+
+    return {
+        "terms": np.array(terms, dtype=f"<U{MAX_TOKEN_LENGTH}"),
+        "indptr": indptr,
+        "docs": post_doc,
+        "weights": weights.astype(np.float32),
+        "ids": np.array(ids, dtype=str),
+    }
+
+
+def build_index(ref_path, index_dir=None) -> Path:
+    """
+    Index every candidate in ref_path and return the index directory. The new
+    index is written to a temporary directory and swapped in, so concurrent
+    queries see either the old index or the new one (see replacing_dir).
+    """
+    ref_path = Path(ref_path)
+    index_dir = Path(index_dir) if index_dir else default_index_dir(ref_path)
+    signature = source_signature(ref_path)
+    items = json.loads(ref_path.read_text(encoding="utf-8"))
+    if not isinstance(items, list):
+        raise ValueError(f"{ref_path} does not contain a JSON list")
+
+    arrays = build_arrays(items)
+    meta = {
+        "version": INDEX_VERSION,
+        "source": {"path": str(ref_path.resolve()), **signature},
+        "pool_size": len(items),
+        "vocabulary": len(arrays["terms"]),
+        "k1": K1,
+        "b": B,
+        "intent_weight": INTENT_WEIGHT,
+    }
+
+    with replacing_dir(index_dir) as tmp:
+        for name, array in arrays.items():
+            np.save(tmp / f"{name}.npy", array)
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=2) + "\n", encoding="utf-8")
+    return index_dir
+
+
+@contextmanager
+def replacing_dir(target):
+    """
+    Yield a fresh directory next to target; when the block exits without an
+    exception, target is switched over to it in one step.
+
+    target is a symlink to a versioned directory (.{name}.XXXX) and the
+    switch renames a new symlink over it, so a reader that resolves target
+    once (see load_built) sees either the old version or the new one, and
+    concurrent rebuilds each install a complete version; the last one wins.
+    The previous version is then removed. A plain directory left by older
+    builds is moved aside first. Where symlinks are unavailable, the new
+    directory replaces target by two renames instead, and a reader can find
+    no target in between.
+    """
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=target.parent, prefix=f".{target.name}."))
+    tmp.chmod(0o755)
+    link = tmp.with_name(tmp.name + ".link")
+    try:
+        yield tmp
+        try:
+            os.symlink(tmp.name, link, target_is_directory=True)
+        except (OSError, NotImplementedError):
+            link = None
+        old = None
+        if target.is_symlink():
+            old = target.parent / os.readlink(target)
+        elif target.exists():
+            old = target.with_name(f".{target.name}.old.{os.getpid()}")
+            os.replace(target, old)
+        if link is not None:
+            os.replace(link, target)
+        else:
+            try:
+                os.replace(tmp, target)
+            except OSError:
+                # A concurrent rebuild installed its version in the meantime
+                shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if link is not None:
+            link.unlink(missing_ok=True)
+        raise
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def load_built(cls, directory, attempts=3):
+    """
+    cls(directory) for a directory written by replacing_dir, retried when a
+    concurrent rebuild removed the version it had resolved to.
+    """
+    for attempt in range(attempts):
+        try:
+            return cls(directory)
+        except FileNotFoundError:
+            if attempt == attempts - 1:
+                raise
+
+
+# ---------------------------------------------------------------------------
+# Query
+# ---------------------------------------------------------------------------
+
+class RefIndex:
+    """A built index opened with memory-mapped arrays."""
+
+    def __init__(self, index_dir):
+        # Resolve once so every file comes from the same index version
+        self.index_dir = Path(index_dir).resolve()
+        self.meta = json.loads((self.index_dir / "meta.json").read_text(encoding="utf-8"))
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"{self.index_dir} was built by an incompatible version")
+        self.terms = self._load("terms")
+        self.indptr = self._load("indptr")
+        self.docs = self._load("docs")
+        self.weights = self._load("weights")
+        self.ids = self._load("ids")
+
+    def _load(self, name):
+        return np.load(self.index_dir / f"{name}.npy", mmap_mode="r")
+
+    def is_current(self, ref_path) -> bool:
+        """Whether the index was built from ref_path as it is now."""
+        source = self.meta.get("source", {})
+        try:
+            signature = source_signature(ref_path)
+        except OSError:
+            return False
+        return (source.get("path") == str(Path(ref_path).resolve())
+                and all(source.get(k) == v for k, v in signature.items()))
+
+    def _column(self, term: str):
+        col = int(np.searchsorted(self.terms, term))
+        if col < len(self.terms) and self.terms[col] == term:
+            return col
+        return None
+
+    def scores(self, content="", visual_intent="") -> np.ndarray:
+        """BM25 score of every candidate for the query (one float per ref.json item)."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        query = Counter(set(tokenize(content)))
+        for term in set(tokenize(visual_intent)):
+            query[term] += INTENT_WEIGHT
+        for term, weight in query.items():
+            col = self._column(term)
+            if col is None:
+                continue
+            start, end = self.indptr[col], self.indptr[col + 1]
+            # A term has at most one posting per candidate, so plain fancy-index += is safe
+            scores[self.docs[start:end]] += weight * self.weights[start:end]
+        return scores
+
+    def search(self, content="", visual_intent="", top_k=50) -> list:
+        """[(id, score), ...] of the top_k best-scoring candidates, best first."""
+        scores = self.scores(content, visual_intent)
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        # Highest score first; ties keep ref.json order
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return [(str(self.ids[i]), round(float(scores[i]), 4)) for i in hits]
+
+
+def open_index(ref_path, index_dir=None, rebuild=True) -> RefIndex:
+    """Open the index for ref_path, (re)building it first if missing or stale."""
+    index_dir = Path(index_dir) if index_dir else default_index_dir(ref_path)
+    try:
+        index = load_built(RefIndex, index_dir)
+        if index.is_current(ref_path):
+            return index
+        reason = f"{ref_path} changed since the index was built"
+    except (OSError, ValueError) as e:
+        reason = f"no usable index ({e})"
+    if not rebuild:
+        raise ValueError(reason)
+    print(f"Rebuilding reference index: {reason}", file=sys.stderr)
+    return RefIndex(build_index(ref_path, index_dir))
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def _text_arg(value):
+    if value and value.startswith("@"):
+        return Path(value[1:]).read_text(encoding="utf-8")
+    return value
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="BM25 index over PaperBananaBench ref.json")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Build (or rebuild) the index for a ref.json")
+    build.add_argument("ref", help="Path to ref.json")
+    build.add_argument("--index-dir", default=None,
+                       help=f"Index directory (default: {INDEX_DIRNAME}/ next to ref.json)")
+
+    query = sub.add_parser("query", help="Print the top-k candidate IDs for a target")
+    query.add_argument("ref", help="Path to ref.json")
+    query.add_argument("--index-dir", default=None,
+                       help=f"Index directory (default: {INDEX_DIRNAME}/ next to ref.json)")
+    query.add_argument("--state", default=None,
+                       help="pipeline_state.json to read content and visual_intent from")
+    query.add_argument("--content", default=None, help="Target content (TEXT or @file)")
+    query.add_argument("--visual-intent", default=None,
+                       help="Target caption / visual intent (TEXT or @file)")
+    query.add_argument("--top-k", type=int, default=50, help="Number of IDs to return")
+    query.add_argument("--no-rebuild", action="store_true",
+                       help="Fail instead of rebuilding a missing or stale index")
+
+    args = parser.parse_args()
+    if args.command == "query":
+        if args.top_k < 1:
+            parser.error("--top-k must be at least 1")
+        if not (args.state or args.content or args.visual_intent):
+            parser.error("query needs --state, --content or --visual-intent")
+    return args
+
+
+def main():
+    args = parse_args()
+
+    try:
+        if args.command == "build":
+            index_dir = build_index(args.ref, args.index_dir)
+            index = RefIndex(index_dir)
+            print(f"Indexed {index.meta['pool_size']} candidates "
+                  f"({index.meta['vocabulary']} terms) -> {index_dir}")
+            return
+
+        content, visual_intent = _text_arg(args.content), _text_arg(args.visual_intent)
+        if args.state:
+            from pipeline_state import PipelineState
+            state = PipelineState(args.state).read()
+            content = content if content is not None else state.get("content")
+            visual_intent = visual_intent if visual_intent is not None else state.get("visual_intent")
+        index = open_index(args.ref, args.index_dir, rebuild=not args.no_rebuild)
+        hits = index.search(content or "", visual_intent or "", args.top_k)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps({
+        "ids": [hit_id for hit_id, _ in hits],
+        "scores": [score for _, score in hits],
+        "pool_size": int(index.meta["pool_size"]),
+    }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
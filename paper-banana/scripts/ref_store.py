@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+PaperBanana Reference Store - Offset-Indexed Examples and Image Thumbnails
+
+The retriever used to load the whole ref.json / agent_selected_12.json to
+pick ten examples, copy those full objects into pipeline_state.json, and the
+planner then read the full-resolution reference images. This store converts
+a reference file once into one JSON line per example plus an offset table,
+so a lookup reads only the selected examples, and pre-generates downscaled
+JPEG thumbnails of their images for use as few-shot inputs. The pipeline
+state only keeps the selected IDs and the reference file's path.
+
+    {ref dir}/ref_store/{stem}/meta.json     version, source ref file size/mtime
+    {ref dir}/ref_store/{stem}/items.jsonl   one compact JSON example per line
+    {ref dir}/ref_store/{stem}/offsets.npy   byte offset of each line (int64, n + 1)
+    {ref dir}/ref_store/{stem}/ids.npy       example IDs, sorted
+    {ref dir}/ref_store/{stem}/rows.npy      line number of each sorted ID
+    {ref dir}/ref_store/thumbs/{size}/{path_to_gt_image}.jpg
+
+{stem} is the reference file name without .json (ref, agent_selected_12).
+Thumbnails are keyed on the image path and shared between the stores of one
+directory; an existing thumbnail is only redone when its image is newer. A
+lookup rebuilds the store first when it is missing or the reference file
+has changed since it was built.
+
+Usage:
+    python ref_store.py build data/PaperBananaBench/diagram/ref.json [--thumbnail-size 512]
+    python ref_store.py get data/PaperBananaBench/diagram/ref.json ref_1 ref_25 ...
+    python ref_store.py get data/PaperBananaBench/diagram/ref.json --state /abs/pipeline_state.json
+    python ref_store.py ids data/PaperBananaBench/plot/ref.json [--random 10]
+
+    get prints a JSON list of the examples in the requested order (IDs given
+    on the command line, or top10_references from the state), each with an
+    added "thumbnail_path" (absolute, or null when no thumbnail exists).
+    Unknown IDs are reported on stderr and skipped. ids prints all example IDs,
+    or a random sample of them, as a JSON list.
+
+Thumbnails need Pillow; without it the store is built without thumbnails.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from ref_index import load_built, replacing_dir, source_signature
+
+try:
+    from PIL import Image
+except ImportError:  # store still works, just without thumbnails
+    Image = None
+
+STORE_VERSION = 1
+STORE_DIRNAME = "ref_store"
+DEFAULT_THUMBNAIL_SIZE = 512
+THUMBNAIL_QUALITY = 85
+
+
+def store_root(ref_path) -> Path:
+    return Path(ref_path).resolve().parent / STORE_DIRNAME
+
+
+def thumbnail_dir(ref_path, size=DEFAULT_THUMBNAIL_SIZE) -> Path:
+    return store_root(ref_path) / "thumbs" / str(size)
+
+
+# ---------------------------------------------------------------------------
+# Thumbnails
+# ---------------------------------------------------------------------------
+
+def make_thumbnail(src: Path, dst: Path, size=DEFAULT_THUMBNAIL_SIZE) -> bool:
+    """Write a JPEG of src no larger than size x size to dst. Returns False if src is unusable."""
+    try:
+        with Image.open(src) as img:
+            img.draft("RGB", (size, size))  # lets JPEG decoding skip most of the pixels
+            if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+                img = img.convert("RGBA")
+                background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+                img = Image.alpha_composite(background, img)
+            img = img.convert("RGB")
+            img.thumbnail((size, size), Image.LANCZOS)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+            img.save(tmp, format="JPEG", quality=THUMBNAIL_QUALITY)
+            os.replace(tmp, dst)
+        return True
+    except OSError as e:
+        print(f"Warning: no thumbnail for {src}: {e}", file=sys.stderr)
+        return False
+
+
+def build_thumbnails(ref_path, items: list, size=DEFAULT_THUMBNAIL_SIZE, workers=None) -> int:
+    """Create missing or outdated thumbnails for items' images; returns how many were written."""
+    if Image is None:
+        print("Warning: Pillow is not installed; skipping thumbnails (pip install Pillow)",
+              file=sys.stderr)
+        return 0
+    base = Path(ref_path).resolve().parent
+    out = thumbnail_dir(ref_path, size)
+    todo = {}
+    for item in items:
+        rel = item.get("path_to_gt_image")
+        if not rel:
+            continue
+        src, dst = base / rel, out / f"{rel}.jpg"
+        try:
+            if dst.exists() and dst.stat().st_mtime >= src.stat().st_mtime:
+                continue
+        except OSError:
+            pass  # missing image: make_thumbnail reports it
+        todo[dst] = src
+
+    if not todo:
+        return 0
+    workers = workers or min(len(todo), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        written = pool.map(lambda dst: make_thumbnail(todo[dst], dst, size), todo)
+        return sum(written)
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+def build_store(ref_path, thumbnail_size=DEFAULT_THUMBNAIL_SIZE, thumbnails=True,
+                workers=None) -> Path:
+    """Convert ref_path into an offset-indexed store (and thumbnails); returns the store directory."""
+    ref_path = Path(ref_path)
+    store_dir = store_root(ref_path) / ref_path.stem
+    signature = source_signature(ref_path)
+    items = json.loads(ref_path.read_text(encoding="utf-8"))
+    if not isinstance(items, list):
+        raise ValueError(f"{ref_path} does not contain a JSON list")
+
+    ids = [str(item.get("id", f"ref_{row}")) for row, item in enumerate(items)]
+    order = np.argsort(np.array(ids, dtype=str), kind="stable")
+    with replacing_dir(store_dir) as tmp:
+        offsets = [0]
+        with open(tmp / "items.jsonl", "wb") as f:
+            for item in items:
+                line = json.dumps(item, ensure_ascii=False, separators=(",", ":"))
+                f.write(line.encode("utf-8") + b"\n")
+                offsets.append(f.tell())
+        np.save(tmp / "offsets.npy", np.array(offsets, dtype=np.int64))
+        np.save(tmp / "ids.npy", np.array(ids, dtype=str)[order])
+        np.save(tmp / "rows.npy", order.astype(np.int32))
+        meta = {
+            "version": STORE_VERSION,
+            "source": {"path": str(ref_path.resolve()), **signature},
+            "count": len(items),
+            "thumbnail_size": thumbnail_size if thumbnails and Image is not None else None,
+        }
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=2) + "\n", encoding="utf-8")
+
+    if thumbnails:
+        written = build_thumbnails(ref_path, items, thumbnail_size, workers)
+        if written:
+            print(f"Wrote {written} thumbnails to {thumbnail_dir(ref_path, thumbnail_size)}",
+                  file=sys.stderr)
+    return store_dir
+
+
+class RefStore:
+    """A built store; examples are read from disk one line at a time."""
+
+    def __init__(self, store_dir):
+        # Resolve once so every file comes from the same store version
+        self.store_dir = Path(store_dir).resolve()
+        self.meta = json.loads((self.store_dir / "meta.json").read_text(encoding="utf-8"))
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"{self.store_dir} was built by an incompatible version")
+        self.offsets = self._load("offsets")
+        self.ids = self._load("ids")
+        self.rows = self._load("rows")
+        # Mapped up front, so lookups keep working after a rebuild removes this version
+        self.lines = self._map_lines()
+        # store_dir is {ref dir}/ref_store/{stem}
+        self.base_dir = self.store_dir.parent.parent
+
+    def _load(self, name):
+        return np.load(self.store_dir / f"{name}.npy", mmap_mode="r")
+
+    def _map_lines(self):
+        path = self.store_dir / "items.jsonl"
+        if path.stat().st_size == 0:  # an empty file cannot be mapped
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(path, dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def is_current(self, ref_path) -> bool:
+        """Whether the store was built from ref_path as it is now."""
+        source = self.meta.get("source", {})
+        try:
+            signature = source_signature(ref_path)
+        except OSError:
+            return False
+        return (source.get("path") == str(Path(ref_path).resolve())
+                and all(source.get(k) == v for k, v in signature.items()))
+
+    def row(self, ref_id: str):
+        """Line number of ref_id in the reference file, or None if unknown."""
+        pos = int(np.searchsorted(self.ids, ref_id))
+        if pos < len(self.ids) and self.ids[pos] == ref_id:
+            return int(self.rows[pos])
+        return None
+
+    def thumbnail_path(self, item: dict):
+        size = self.meta.get("thumbnail_size")
+        rel = item.get("path_to_gt_image")
+        if not size or not rel:
+            return None
+        path = self.base_dir / STORE_DIRNAME / "thumbs" / str(size) / f"{rel}.jpg"
+        return str(path) if path.exists() else None
+
+    def get_many(self, ref_ids) -> list:
+        """Examples for ref_ids in the given order, each with "thumbnail_path"; unknown IDs are skipped."""
+        items = []
+        for ref_id in ref_ids:
+            row = self.row(str(ref_id))
+            if row is None:
+                print(f"Warning: unknown reference ID {ref_id}", file=sys.stderr)
+                continue
+            item = json.loads(self.lines[self.offsets[row]:self.offsets[row + 1]].tobytes())
+            item["thumbnail_path"] = self.thumbnail_path(item)
+            items.append(item)
+        return items
+
+    def all_ids(self) -> list:
+        """Every example ID in reference-file order."""
+        ordered = np.empty(len(self.ids), dtype=self.ids.dtype)
+        ordered[self.rows] = self.ids
+        return [str(i) for i in ordered]
+
+
+def open_store(ref_path, rebuild=True, **build_options) -> RefStore:
+    """Open the store for ref_path, (re)building it first if missing or stale."""
+    store_dir = store_root(ref_path) / Path(ref_path).stem
+    try:
+        store = load_built(RefStore, store_dir)
+        if store.is_current(ref_path):
+            return store
+        reason = f"{ref_path} changed since the store was built"
+    except (OSError, ValueError) as e:
+        reason = f"no usable store ({e})"
+    if not rebuild:
+        raise ValueError(reason)
+    print(f"Rebuilding reference store: {reason}", file=sys.stderr)
+    return RefStore(build_store(ref_path, **build_options))
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offset-indexed PaperBananaBench reference store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Build (or rebuild) the store and thumbnails")
+    build.add_argument("ref", help="Path to ref.json or agent_selected_12.json")
+    build.add_argument("--thumbnail-size", type=int, default=DEFAULT_THUMBNAIL_SIZE,
+                       help="Longest thumbnail side in pixels")
+    build.add_argument("--no-thumbnails", action="store_true", help="Skip thumbnail generation")
+    build.add_argument("--workers", type=int, default=None,
+                       help="Thumbnail threads (default: CPU count)")
+
+    get = sub.add_parser("get", help="Print selected examples as a JSON list")
+    get.add_argument("ref", help="Path to ref.json or agent_selected_12.json")
+    get.add_argument("ids", nargs="*", help="Example IDs (default: top10_references from --state)")
+    get.add_argument("--state", default=None, help="pipeline_state.json to read IDs from")
+    get.add_argument("--no-rebuild", action="store_true",
+                     help="Fail instead of rebuilding a missing or stale store")
+
+    ids = sub.add_parser("ids", help="Print example IDs as a JSON list")
+    ids.add_argument("ref", help="Path to ref.json or agent_selected_12.json")
+    ids.add_argument("--random", type=int, default=None, metavar="N",
+                     help="Print a random sample of N IDs instead of all")
+    ids.add_argument("--no-rebuild", action="store_true",
+                     help="Fail instead of rebuilding a missing or stale store")
+
+    args = parser.parse_args()
+    if args.command == "get" and not (args.ids or args.state):
+        parser.error("get needs IDs or --state")
+    return args
+
+
+def main():
+    args = parse_args()
+
+    try:
+        if args.command == "build":
+            store_dir = build_store(args.ref, args.thumbnail_size,
+                                    thumbnails=not args.no_thumbnails, workers=args.workers)
+            print(f"Stored {len(RefStore(store_dir))} examples -> {store_dir}")
+            return
+
+        store = open_store(args.ref, rebuild=not args.no_rebuild)
+        if args.command == "ids":
+            result = store.all_ids()
+            if args.random is not None:
+                result = random.sample(result, min(args.random, len(result)))
+        else:
+            ref_ids = args.ids
+            if not ref_ids:
+                from pipeline_state import PipelineState
+                ref_ids = PipelineState(args.state).get("top10_references") or []
+            result = store.get_many(ref_ids)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
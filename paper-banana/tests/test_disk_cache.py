@@ -0,0 +1,16 @@
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+PAPER_BANANA_CACHE = REPO_ROOT / "paper-banana" / "scripts" / "disk_cache.py"
+PATENT_WRITER_CACHE = (REPO_ROOT / "patent-writer" / "skills" / "patent-diagram-drawing"
+                       / "scripts" / "disk_cache.py")
+
+
+def _code_after_defaults(path: Path) -> str:
+    text = path.read_text(encoding="utf-8")
+    return text[text.index("def make_key"):]
+
+
+def test_plugin_copies_stay_in_sync():
+    # Each plugin ships its own copy; only the docstring and default root differ
+    assert _code_after_defaults(PAPER_BANANA_CACHE) == _code_after_defaults(PATENT_WRITER_CACHE)
@@ -0,0 +1,29 @@
+import sys
+
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import execute_plot  # noqa: E402
+
+PLOT_CODE = "import matplotlib.pyplot as plt\nplt.plot([1, 4, 2, 3])\n"
+
+
+@pytest.mark.parametrize("tiers", [["preview", "final"], ["final", "preview"]])
+def test_two_tiers_write_two_files(tmp_path, tiers):
+    output = tmp_path / "out.jpg"
+    assert execute_plot.execute_and_save(PLOT_CODE, output, tiers=tiers)
+
+    paths = execute_plot.tier_output_paths(output, tiers)
+    assert len(set(paths.values())) == 2
+    assert all(path.is_file() for path in paths.values())
+    assert paths[tiers[0]] == output
+
+
+def test_output_extension_must_match_first_tier(tmp_path):
+    with pytest.raises(ValueError):
+        execute_plot.tier_output_paths(tmp_path / "x.jpg", ["pdf"])
+    assert not execute_plot.execute_and_save(PLOT_CODE, tmp_path / "x.jpg", tiers=["pdf"])
+    assert not (tmp_path / "x.jpg").exists()
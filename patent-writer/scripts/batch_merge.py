@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+batch_merge.py - 批量生成多份专利申请文件
+
+对每个工作目录执行与 merge_to_docx.py 相同的合并：
+    04_content/abstract.md、claims.md、description.md
+    05_diagrams/figures.json（可选，存在则一并插入附图）
+    -> 06_final/patent_application.docx
+
+各工作目录在进程池中并行处理。每个 worker 进程启动时只加载一次模板骨架
+（见 template_cache.py），之后该进程处理的每份申请都从骨架深拷贝一份文档，
+不再重复解析、校验模板。
+单份申请失败不影响其他申请，结束时逐份汇报耗时与失败原因。
+
+用法:
+    python3 batch_merge.py WORKDIR [WORKDIR ...] \
+        [--list dirs.txt] [--template PATH] [--workers N] [--stream] \
+        [--no-template-cache] [--figure-mode gray|bw|original] [--figure-dpi 300] \
+        [--report batch_report.json]
+
+--list 文件每行一个工作目录，空行和以 # 开头的行忽略。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from figure_images import DEFAULT_DPI, DEFAULT_FIGURE_MODE, FIGURE_MODES
+from merge_to_docx import assemble
+from template_cache import DEFAULT_SKELETON_DIR, load_skeleton
+
+DEFAULT_TEMPLATE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 'skills', 'writing-patent', 'references', 'template.docx',
+)
+
+ABSTRACT = os.path.join('04_content', 'abstract.md')
+CLAIMS = os.path.join('04_content', 'claims.md')
+DESCRIPTION = os.path.join('04_content', 'description.md')
+FIGURES_MANIFEST = os.path.join('05_diagrams', 'figures.json')
+OUTPUT = os.path.join('06_final', 'patent_application.docx')
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+_skeleton = None
+
+
+def init_worker(template_path, skeleton_dir=DEFAULT_SKELETON_DIR):
+    """进程池 initializer：每个 worker 只加载一次模板骨架。"""
+    global _skeleton
+    _skeleton = load_skeleton(template_path, skeleton_dir)
+
+
+def _last_line(text):
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return lines[-1] if lines else ''
+
+
+def assemble_filing(workdir, stream=False, figure_mode=DEFAULT_FIGURE_MODE,
+                    figure_dpi=DEFAULT_DPI):
+    """
+    合并单个工作目录，返回结果字典:
+        {workdir, output, success, seconds, error, log}
+    合并过程的输出收集到 log 中，避免多个 worker 的输出交错。
+    """
+    start = time.perf_counter()
+    output = os.path.join(workdir, OUTPUT)
+    result = {'workdir': workdir, 'output': output, 'success': False,
+              'seconds': None, 'error': None, 'log': ''}
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            for name in (ABSTRACT, CLAIMS, DESCRIPTION):
+                if not os.path.exists(os.path.join(workdir, name)):
+                    raise FileNotFoundError(f'{name} 不存在')
+            manifest = os.path.join(workdir, FIGURES_MANIFEST)
+            doc = _skeleton.new_document()
+            assemble(
+                doc,
+                os.path.join(workdir, ABSTRACT),
+                os.path.join(workdir, CLAIMS),
+                os.path.join(workdir, DESCRIPTION),
+                output,
+                figures_manifest=manifest if os.path.exists(manifest) else None,
+                stream=stream,
+                figure_mode=figure_mode,
+                figure_dpi=figure_dpi,
+            )
+        result['success'] = True
+    except SystemExit:
+        # 附图参数解析等辅助函数出错时打印原因后 sys.exit，原因在日志最后一行
+        result['error'] = _last_line(log.getvalue()) or '合并中止'
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    result['log'] = log.getvalue()
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Batch
+# ---------------------------------------------------------------------------
+
+def read_workdir_list(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f
+                if line.strip() and not line.strip().startswith('#')]
+
+
+def run_batch(workdirs, template_path, workers=None, stream=False,
+              skeleton_dir=DEFAULT_SKELETON_DIR, figure_mode=DEFAULT_FIGURE_MODE,
+              figure_dpi=DEFAULT_DPI):
+    """并行合并全部工作目录，按完成顺序逐份打印，返回与 workdirs 同序的结果列表。"""
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(template_path, skeleton_dir)) as pool:
+        futures = {
+            pool.submit(assemble_filing, d, stream, figure_mode, figure_dpi): d
+            for d in workdirs
+        }
+        for future in as_completed(futures):
+            workdir = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # worker 进程异常退出等情况
+                result = {'workdir': workdir, 'output': os.path.join(workdir, OUTPUT),
+                          'success': False, 'seconds': None,
+                          'error': f'{type(e).__name__}: {e}', 'log': ''}
+            results[workdir] = result
+            status = '成功' if result['success'] else f'失败: {result["error"]}'
+            seconds = f'{result["seconds"]:.2f}s' if result['seconds'] is not None else '-'
+            print(f'  [{len(results)}/{len(workdirs)}] {workdir} ({seconds}) {status}')
+    return [results[d] for d in workdirs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量生成多份专利申请文件')
+    parser.add_argument('workdirs', nargs='*', help='工作目录（含 04_content/）')
+    parser.add_argument('--list', default=None, help='工作目录列表文件，每行一个')
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE, help='模板 .docx 路径')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='并行进程数（默认为 CPU 核数）')
+    parser.add_argument('--stream', action='store_true',
+                        help='说明书流式写出（同 merge_to_docx.py --stream）')
+    parser.add_argument('--no-template-cache', action='store_true',
+                        help='不读写预编译的模板骨架（每个 worker 仍只解析一次模板）')
+    parser.add_argument('--figure-mode', choices=FIGURE_MODES, default=DEFAULT_FIGURE_MODE,
+                        help='附图预处理（同 merge_to_docx.py --figure-mode）')
+    parser.add_argument('--figure-dpi', type=int, default=DEFAULT_DPI,
+                        help='附图目标分辨率（同 merge_to_docx.py --figure-dpi）')
+    parser.add_argument('--report', default=None,
+                        help='结果 JSON 路径（逐份记录耗时、失败原因与合并日志）')
+    args = parser.parse_args()
+
+    workdirs = list(args.workdirs)
+    if args.list:
+        workdirs += read_workdir_list(args.list)
+    # 去重并保持顺序，避免两个 worker 同时写同一个输出文件
+    workdirs = list(dict.fromkeys(os.path.abspath(d) for d in workdirs))
+    if not workdirs:
+        parser.error('至少需要一个工作目录（位置参数或 --list）')
+    if not os.path.exists(args.template):
+        print(f'错误: 模板文件不存在: {args.template}', file=sys.stderr)
+        sys.exit(1)
+    skeleton_dir = None if args.no_template_cache else DEFAULT_SKELETON_DIR
+    # 先在主进程校验模板并生成骨架文件，模板有误时直接报错，各 worker 只需加载骨架
+    try:
+        load_skeleton(args.template, skeleton_dir)
+    except ValueError as e:
+        print(f'错误: {e}', file=sys.stderr)
+        sys.exit(1)
+
+    print(f'正在合并 {len(workdirs)} 份申请...')
+    start = time.perf_counter()
+    results = run_batch(workdirs, args.template, args.workers, args.stream, skeleton_dir,
+                        args.figure_mode, args.figure_dpi)
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if not r['success']]
+    print(f'\n完成: {len(results) - len(failed)} 份成功，{len(failed)} 份失败，'
+          f'总耗时 {elapsed:.2f}s')
+    for r in failed:
+        print(f'  失败: {r["workdir"]}: {r["error"]}', file=sys.stderr)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'seconds': round(elapsed, 3), 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f'结果已写入: {args.report}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+bench_section_index.py - 对比 Section 段落定位的旧实现与 SectionIndex
+
+在模板上生成一份说明书（Section 3）含 N 个段落的合成文档，然后分别用
+旧实现（每个 filler 调用 find_section_boundaries，循环内取
+doc.paragraphs[i]）和 SectionIndex 重新填充全部 Section，只计填充耗时，
+并校验两者生成的 document.xml 完全一致。
+
+用法:
+    python3 bench_section_index.py [--paragraphs 1000 2000 4000] [--template PATH]
+"""
+
+import argparse
+import io
+import os
+import time
+
+from docx import Document
+from docx.oxml.ns import qn
+from lxml import etree
+
+from docx_sections import SectionIndex
+from merge_to_docx import (
+    fill_section_0_abstract,
+    fill_section_1_clear,
+    fill_section_2_claims,
+    fill_section_3_description,
+    fill_section_4_clear,
+    make_paragraph_element,
+)
+
+DEFAULT_TEMPLATE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 'skills', 'writing-patent', 'references', 'template.docx',
+)
+
+
+# ---------------------------------------------------------------------------
+# 旧实现（引入 SectionIndex 之前的段落定位逻辑原样保留，内容构造从简）
+# ---------------------------------------------------------------------------
+
+def legacy_find_section_boundaries(doc):
+    paragraphs = doc.paragraphs
+    boundaries = []
+    for i, p in enumerate(paragraphs):
+        pPr = p._element.find(qn('w:pPr'))
+        if pPr is not None and pPr.find(qn('w:sectPr')) is not None:
+            boundaries.append(i)
+
+    sections = []
+    start = 0
+    for b in boundaries:
+        sections.append((start, b, b))
+        start = b + 1
+    sections.append((start, len(paragraphs) - 1, None))
+    return sections
+
+
+def legacy_collect_and_remove(doc, sec_start, sec_end, sectpr_idx):
+    sectpr_para = doc.paragraphs[sectpr_idx]._element
+    to_remove = []
+    for i in range(sec_start, sec_end + 1):
+        if i == sectpr_idx:
+            continue
+        to_remove.append(doc.paragraphs[i]._element)
+    for elem in to_remove:
+        elem.getparent().remove(elem)
+    return sectpr_para
+
+
+def legacy_clear_last_section(doc, sec_start, sec_end):
+    to_remove = []
+    for i in range(sec_start, sec_end + 1):
+        to_remove.append(doc.paragraphs[i]._element)
+    for elem in to_remove:
+        elem.getparent().remove(elem)
+
+
+def legacy_fill(doc, abstract_text, claims, desc_data):
+    sections = legacy_find_section_boundaries(doc)
+    sec_start, sec_end, sectpr_idx = sections[0]
+    sectpr_para = legacy_collect_and_remove(doc, sec_start, sec_end, sectpr_idx)
+    sectpr_para.addprevious(make_paragraph_element(abstract_text, first_line_indent=True))
+
+    sec_start, sec_end, sectpr_idx = legacy_find_section_boundaries(doc)[1]
+    legacy_collect_and_remove(doc, sec_start, sec_end, sectpr_idx)
+
+    sec_start, sec_end, sectpr_idx = legacy_find_section_boundaries(doc)[2]
+    sectpr_para = legacy_collect_and_remove(doc, sec_start, sec_end, sectpr_idx)
+    for claim_num, claim_text in claims:
+        sectpr_para.addprevious(make_paragraph_element(claim_text, first_line_indent=False))
+        sectpr_para.addprevious(make_paragraph_element('', first_line_indent=False))
+
+    sec_start, sec_end, sectpr_idx = legacy_find_section_boundaries(doc)[3]
+    sectpr_para = legacy_collect_and_remove(doc, sec_start, sec_end, sectpr_idx)
+    sectpr_para.addprevious(make_paragraph_element(
+        desc_data['invention_name'], bold=True, center=True, first_line_indent=False))
+    for section in desc_data['sections']:
+        sectpr_para.addprevious(make_paragraph_element(
+            section['title'], bold=True, first_line_indent=False))
+        for para_text in section['paragraphs']:
+            sectpr_para.addprevious(make_paragraph_element(para_text, first_line_indent=True))
+
+    sec_start, sec_end, sectpr_idx = legacy_find_section_boundaries(doc)[4]
+    legacy_clear_last_section(doc, sec_start, sec_end)
+
+
+def indexed_fill(doc, abstract_text, claims, desc_data):
+    index = SectionIndex.from_document(doc)
+    fill_section_0_abstract(index, abstract_text)
+    fill_section_1_clear(index)
+    fill_section_2_claims(index, claims)
+    fill_section_3_description(index, desc_data)
+    fill_section_4_clear(index)
+
+
+# ---------------------------------------------------------------------------
+# 合成数据
+# ---------------------------------------------------------------------------
+
+def synthetic_content(n_paragraphs):
+    abstract_text = '本发明公开了一种**数据处理**方法。'
+    claims = [(i, f'{i}. 一种方法，其特征在于，包括步骤A与步骤B。') for i in range(1, 11)]
+    titles = ['技术领域', '背景技术', '发明内容', '附图说明', '具体实施方式']
+    per_section = max(1, n_paragraphs // len(titles))
+    desc_data = {
+        'invention_name': '一种数据处理方法',
+        'sections': [
+            {
+                'title': title,
+                'level': 2,
+                'paragraphs': [f'{title}第{k}段，包含**加粗**内容和普通内容。' for k in range(per_section)],
+            }
+            for title in titles
+        ],
+    }
+    return abstract_text, claims, desc_data
+
+
+def build_filled_docx(template, content):
+    """生成一份已填充的文档（模拟对已有输出重新合并），返回 docx 字节。"""
+    doc = Document(template)
+    indexed_fill(doc, *content)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def timed_fill(fill, docx_bytes, content):
+    doc = Document(io.BytesIO(docx_bytes))
+    start = time.perf_counter()
+    fill(doc, *content)
+    elapsed = time.perf_counter() - start
+    return elapsed, etree.tostring(doc.element)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比 Section 段落定位的旧实现与 SectionIndex')
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE, help='模板 .docx 路径')
+    parser.add_argument('--paragraphs', type=int, nargs='+', default=[1000, 2000, 4000],
+                        help='说明书段落数（可传入多个）')
+    args = parser.parse_args()
+
+    print(f'{"段落数":>8} {"旧实现(s)":>12} {"SectionIndex(s)":>16} {"加速比":>8}')
+    for n in args.paragraphs:
+        content = synthetic_content(n)
+        docx_bytes = build_filled_docx(args.template, content)
+        legacy_s, legacy_xml = timed_fill(legacy_fill, docx_bytes, content)
+        indexed_s, indexed_xml = timed_fill(indexed_fill, docx_bytes, content)
+        if legacy_xml != indexed_xml:
+            raise SystemExit(f'错误: {n} 段时两种实现的输出不一致')
+        print(f'{n:>8} {legacy_s:>12.3f} {indexed_s:>16.3f} {legacy_s / indexed_s:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
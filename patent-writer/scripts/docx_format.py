@@ -0,0 +1,107 @@
+"""
+docx_format.py - 专利申请文件的段落/文字格式片段
+
+merge_to_docx.py 与 insert_diagrams.py 共用。每种格式组合（正文、无缩进、
+居中、加粗、图片段落）的 w:pPr / w:r 只用 OxmlElement 构建一次作为原型，
+之后每个段落、每个 run 都从原型深拷贝，不再逐个创建 w:spacing、w:ind、
+w:rFonts、w:sz 等子元素。
+
+格式规范: 宋体/Times New Roman, 14pt, 行距 26pt 固定值, 首行缩进 28pt (可选)。
+图片段落使用单倍自动行距，避免固定行距裁剪图片。
+"""
+
+import copy
+from functools import lru_cache
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+
+def _spacing(line, line_rule):
+    spacing = OxmlElement('w:spacing')
+    spacing.set(qn('w:line'), line)
+    spacing.set(qn('w:lineRule'), line_rule)
+    spacing.set(qn('w:before'), '0')
+    spacing.set(qn('w:after'), '0')
+    return spacing
+
+
+def _ind(first_line):
+    ind = OxmlElement('w:ind')
+    ind.set(qn('w:firstLine'), first_line)
+    return ind
+
+
+def _jc_center():
+    jc = OxmlElement('w:jc')
+    jc.set(qn('w:val'), 'center')
+    return jc
+
+
+@lru_cache(maxsize=None)
+def _paragraph_prototype(first_line_indent, center):
+    p = OxmlElement('w:p')
+    pPr = OxmlElement('w:pPr')
+    # 行距: 26pt 固定值 = 520 twips；首行缩进 28pt = 560 twips
+    pPr.append(_spacing('520', 'exact'))
+    pPr.append(_ind('560' if first_line_indent else '0'))
+    if center:
+        pPr.append(_jc_center())
+    p.append(pPr)
+    return p
+
+
+@lru_cache(maxsize=None)
+def _picture_pPr_prototype():
+    pPr = OxmlElement('w:pPr')
+    pPr.append(_jc_center())
+    pPr.append(_spacing('240', 'auto'))
+    pPr.append(_ind('0'))
+    return pPr
+
+
+@lru_cache(maxsize=None)
+def _run_prototype(bold, font_size_pt):
+    r = OxmlElement('w:r')
+    rPr = OxmlElement('w:rPr')
+
+    rFonts = OxmlElement('w:rFonts')
+    rFonts.set(qn('w:ascii'), 'Times New Roman')
+    rFonts.set(qn('w:hAnsi'), 'Times New Roman')
+    rFonts.set(qn('w:eastAsia'), '宋体')
+    rPr.append(rFonts)
+
+    sz = OxmlElement('w:sz')
+    sz.set(qn('w:val'), str(font_size_pt * 2))
+    rPr.append(sz)
+    szCs = OxmlElement('w:szCs')
+    szCs.set(qn('w:val'), str(font_size_pt * 2))
+    rPr.append(szCs)
+
+    if bold:
+        rPr.append(OxmlElement('w:b'))
+        rPr.append(OxmlElement('w:bCs'))
+
+    r.append(rPr)
+
+    t = OxmlElement('w:t')
+    t.set(qn('xml:space'), 'preserve')
+    r.append(t)
+    return r
+
+
+def new_paragraph(first_line_indent=True, center=False):
+    """返回一个只含 w:pPr 的新 w:p（26pt 固定行距）。"""
+    return copy.deepcopy(_paragraph_prototype(bool(first_line_indent), bool(center)))
+
+
+def new_run(text, bold=False, font_size_pt=14):
+    """返回一个带标准字体格式的新 w:r。"""
+    r = copy.deepcopy(_run_prototype(bool(bold), font_size_pt))
+    r[-1].text = text
+    return r
+
+
+def picture_paragraph_properties():
+    """返回图片段落的新 w:pPr（居中、单倍自动行距、无首行缩进）。"""
+    return copy.deepcopy(_picture_pPr_prototype())
@@ -0,0 +1,67 @@
+"""
+docx_sections.py - 专利申请 Word 文件的 Section 段落索引
+
+merge_to_docx.py 与 insert_diagrams.py 共用。SectionIndex 对 body 的直接
+子 w:p 只遍历一次，记录每个 Section 的内容段落及其结束锚点；之后的清空、
+插入都经由索引完成并同步更新，不再反复重建 doc.paragraphs、重新扫描
+每个段落的 w:pPr，整个填充过程的总开销与段落数成线性关系。
+"""
+
+from docx.oxml.ns import qn
+
+
+class SectionIndex:
+    """
+    body 中各 Section 的段落索引。
+
+    前 N-1 个 Section 以段落内嵌 w:sectPr 的段落结束（该段落即锚点，
+    不计入内容段落），最后一个 Section 以 body 级 w:sectPr 结束。
+    与 doc.paragraphs 一致，只统计 body 的直接子段落。
+    """
+
+    def __init__(self, body):
+        self.body = body
+        self._paragraphs = [[]]
+        self._anchors = []
+        for p in body.iterchildren(qn('w:p')):
+            pPr = p.find(qn('w:pPr'))
+            if pPr is not None and pPr.find(qn('w:sectPr')) is not None:
+                self._anchors.append(p)
+                self._paragraphs.append([])
+            else:
+                self._paragraphs[-1].append(p)
+        # 最后一个 Section 的锚点是 body 级 sectPr（不在段落内）
+        self._anchors.append(None)
+        self._body_sectpr = body.find(qn('w:sectPr'))
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(doc.element.body)
+
+    def __len__(self):
+        return len(self._anchors)
+
+    def paragraphs(self, i):
+        """返回 Section i 的内容段落元素（不含 sectPr 段落）。"""
+        return list(self._paragraphs[i])
+
+    def anchor(self, i):
+        """返回 Section i 的 sectPr 段落元素；最后一个 Section 返回 None。"""
+        return self._anchors[i]
+
+    def clear(self, i):
+        """删除 Section i 的全部内容段落，保留 sectPr 段落。"""
+        for p in self._paragraphs[i]:
+            self.body.remove(p)
+        self._paragraphs[i] = []
+
+    def append(self, i, p):
+        """把段落元素追加到 Section i 末尾（锚点之前）。"""
+        anchor = self._anchors[i]
+        if anchor is None:
+            anchor = self._body_sectpr
+        if anchor is not None:
+            anchor.addprevious(p)
+        else:
+            self.body.append(p)
+        self._paragraphs[i].append(p)
@@ -0,0 +1,103 @@
+"""
+figure_images.py - 附图嵌入前的预处理
+
+generate.py 输出的附图为 2K/4K 彩色 PNG，而 Word 中最大显示宽度只有 17cm，
+原图直接嵌入会让 .docx 膨胀到数十 MB。嵌入前按目标分辨率重采样：
+
+- 宽度超过 17cm × dpi 对应像素数（300 dpi 时为 2008 像素）的图等比缩小，不放大；
+- 专利附图为黑白线条图，转为 8 位灰度（gray）或 1 位黑白（bw）PNG；
+- 内容相同的文件只处理一次（按 sha256 去重），不同文件在线程池中并行处理。
+
+依赖 Pillow；未安装时原样嵌入并给出提示。
+"""
+
+import hashlib
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # 无 Pillow 时退回原图嵌入
+    Image = None
+
+DEFAULT_DPI = 300
+MAX_WIDTH_CM = 17
+FIGURE_MODES = ('gray', 'bw', 'original')
+DEFAULT_FIGURE_MODE = 'gray'
+
+# 1 位黑白化的灰度阈值：线条抗锯齿边缘偏暗的归黑，其余归白
+BW_THRESHOLD = 160
+
+
+def target_width_px(max_width_cm=MAX_WIDTH_CM, dpi=DEFAULT_DPI):
+    return round(max_width_cm / 2.54 * dpi)
+
+
+def _flatten_to_gray(img):
+    """透明背景铺白后转灰度。"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img)
+    return img.convert('L')
+
+
+def process_image(data, mode=DEFAULT_FIGURE_MODE, dpi=DEFAULT_DPI, max_width_cm=MAX_WIDTH_CM):
+    """把一张图的字节处理为适合嵌入的 PNG 字节。"""
+    with Image.open(io.BytesIO(data)) as img:
+        img = _flatten_to_gray(img)
+
+    max_px = target_width_px(max_width_cm, dpi)
+    if img.width > max_px:
+        height = max(1, round(img.height * max_px / img.width))
+        img = img.resize((max_px, height), Image.LANCZOS)
+
+    if mode == 'bw':
+        img = img.point(lambda v: 255 if v >= BW_THRESHOLD else 0, mode='1')
+
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', dpi=(dpi, dpi))
+    return buf.getvalue()
+
+
+def prepare_images(paths, mode=DEFAULT_FIGURE_MODE, dpi=DEFAULT_DPI,
+                   max_width_cm=MAX_WIDTH_CM, workers=None):
+    """
+    预处理一组附图，返回 {路径: PNG 字节}。
+
+    mode 为 'original' 或未安装 Pillow 时返回空字典（调用方按路径嵌入原图）。
+    内容相同的文件只处理一次，结果字节对象在各路径间共享。
+    """
+    if mode == 'original' or not paths:
+        return {}
+    if Image is None:
+        print('  提示: 未安装 Pillow，附图按原图嵌入（pip install Pillow）', file=sys.stderr)
+        return {}
+
+    digests, originals = {}, {}
+    for path in dict.fromkeys(paths):
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        digests[path] = digest
+        originals.setdefault(digest, data)
+
+    def work(digest):
+        try:
+            return digest, process_image(originals[digest], mode, dpi, max_width_cm)
+        except OSError as e:
+            # Pillow 无法识别的格式按原图嵌入
+            print(f'  提示: 附图预处理失败，按原图嵌入: {e}', file=sys.stderr)
+            return digest, originals[digest]
+
+    workers = workers or min(len(originals), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        processed = dict(pool.map(work, originals))
+
+    before = sum(len(d) for d in originals.values())
+    after = sum(len(d) for d in processed.values())
+    print(f'  附图预处理: {len(digests)} 个文件（去重后 {len(processed)} 张），'
+          f'{before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB')
+    return {path: processed[digest] for path, digest in digests.items()}
@@ -22,130 +22,107 @@ insert_diagrams.py - 向专利申请 Word 文件中插入附图
     --figures 格式为 "图号:文件路径"，可传入多个，按传入顺序插入。
     --section 1 表示摘要附图（仅插入图片，无标签）。
     --section 4 表示说明书附图（每张图前加居中图号标签）。
+
+    --figure-mode 附图预处理方式（见 figure_images.py）: gray 缩放到 17cm × --figure-dpi
+    并转灰度（默认），bw 转 1 位黑白，original 原图嵌入。
+
+生成完整申请文件时，推荐改用 merge_to_docx.py --figures-manifest，
+在同一次加载/保存中完成文本填充和两个附图 Section 的插入。
 """
 
 import argparse
+import io
+import json
 import os
 import sys
 
 from docx import Document
-from docx.shared import Cm
-from docx.oxml.ns import qn
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
 from docx.oxml import OxmlElement
+from docx.oxml.shape import CT_Inline
+from docx.shared import Cm
+
+from docx_format import new_paragraph, new_run, picture_paragraph_properties
+from docx_sections import SectionIndex
+from figure_images import DEFAULT_DPI, DEFAULT_FIGURE_MODE, FIGURE_MODES, prepare_images
 
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def find_section_boundaries(doc):
-    """找到每个 Section 的段落索引范围。"""
-    paragraphs = doc.paragraphs
-    boundaries = []
-    for i, p in enumerate(paragraphs):
-        pPr = p._element.find(qn('w:pPr'))
-        if pPr is not None and pPr.find(qn('w:sectPr')) is not None:
-            boundaries.append(i)
-
-    sections = []
-    start = 0
-    for b in boundaries:
-        sections.append((start, b, b))
-        start = b + 1
-    sections.append((start, len(paragraphs) - 1, None))
-    return sections
-
-
 def make_text_paragraph(text='', center=False, font_size_pt=14):
-    """创建一个标准格式的文本段落（26pt 固定行距）。"""
-    p = OxmlElement('w:p')
-    pPr = OxmlElement('w:pPr')
-
-    spacing = OxmlElement('w:spacing')
-    spacing.set(qn('w:line'), '520')
-    spacing.set(qn('w:lineRule'), 'exact')
-    spacing.set(qn('w:before'), '0')
-    spacing.set(qn('w:after'), '0')
-    pPr.append(spacing)
+    """创建一个标准格式的文本段落（26pt 固定行距，无首行缩进）。"""
+    p = new_paragraph(first_line_indent=False, center=center)
+    if text:
+        p.append(new_run(text, font_size_pt=font_size_pt))
+    return p
 
-    ind = OxmlElement('w:ind')
-    ind.set(qn('w:firstLine'), '0')
-    pPr.append(ind)
 
-    if center:
-        jc = OxmlElement('w:jc')
-        jc.set(qn('w:val'), 'center')
-        pPr.append(jc)
+class PictureInserter:
+    """
+    直接构建图片段落（不经 doc.add_paragraph 追加到 body 末尾再移动）。
 
-    p.append(pPr)
+    每个图片文件只读取、注册一次，之后引用同一文件的附图复用其关系 id；
+    图形 id 只在创建时扫描一次文档，之后递增分配。
+    images 为 prepare_images 的结果（可选），给出时嵌入预处理后的字节而不是原文件。
+    """
 
-    if text:
+    def __init__(self, doc, images=None, max_width_cm=17):
+        self.part = doc.part
+        self.images = images or {}
+        self.max_width = Cm(max_width_cm)
+        self._registered = {}
+        self._next_id = None
+
+    def register(self, image_path):
+        """返回 (rId, Image)；同一路径只注册一次。"""
+        if image_path not in self._registered:
+            data = self.images.get(image_path)
+            source = io.BytesIO(data) if data is not None else image_path
+            self._registered[image_path] = self.part.get_or_add_image(source)
+        return self._registered[image_path]
+
+    def _shape_id(self):
+        if self._next_id is None:
+            self._next_id = self.part.next_id
+        shape_id = self._next_id
+        self._next_id += 1
+        return shape_id
+
+    def paragraph(self, image_path):
+        """
+        创建一个包含图片的居中段落（宽 17cm，按原始宽高比等比缩放）。
+        使用单倍自动行距，避免固定行距裁剪图片。
+        """
+        rId, image = self.register(image_path)
+        cx, cy = image.scaled_dimensions(self.max_width, None)
+        inline = CT_Inline.new_pic_inline(self._shape_id(), rId, image.filename, cx, cy)
+
+        drawing = OxmlElement('w:drawing')
+        drawing.append(inline)
         r = OxmlElement('w:r')
-        rPr = OxmlElement('w:rPr')
-
-        rFonts = OxmlElement('w:rFonts')
-        rFonts.set(qn('w:ascii'), 'Times New Roman')
-        rFonts.set(qn('w:hAnsi'), 'Times New Roman')
-        rFonts.set(qn('w:eastAsia'), '宋体')
-        rPr.append(rFonts)
-
-        sz = OxmlElement('w:sz')
-        sz.set(qn('w:val'), str(font_size_pt * 2))
-        rPr.append(sz)
-        szCs = OxmlElement('w:szCs')
-        szCs.set(qn('w:val'), str(font_size_pt * 2))
-        rPr.append(szCs)
-
-        r.append(rPr)
-        t = OxmlElement('w:t')
-        t.set(qn('xml:space'), 'preserve')
-        t.text = text
-        r.append(t)
-        p.append(r)
+        r.append(drawing)
 
-    return p
+        p = OxmlElement('w:p')
+        # 居中、单倍自动行距（避免固定行距裁剪图片）、无首行缩进
+        p.append(picture_paragraph_properties())
+        p.append(r)
+        return p
 
 
-def add_picture_paragraph(doc, image_path, max_width_cm=17):
+def drop_unused_images(doc):
     """
-    创建一个包含图片的居中段落。
-    使用单倍自动行距，避免固定行距裁剪图片。
+    删除正文不再引用的图片关系（重新填充附图 Section 后旧图片会残留），
+    返回删除的数量。对应的图片部件不再被引用，保存时不会写入 docx。
     """
-    p = doc.add_paragraph()
-    pPr = p._element.find(qn('w:pPr'))
-    if pPr is None:
-        pPr = OxmlElement('w:pPr')
-        p._element.insert(0, pPr)
-
-    # 居中
-    jc = OxmlElement('w:jc')
-    jc.set(qn('w:val'), 'center')
-    pPr.append(jc)
-
-    # 单倍自动行距（避免固定行距裁剪图片）
-    spacing = OxmlElement('w:spacing')
-    spacing.set(qn('w:line'), '240')
-    spacing.set(qn('w:lineRule'), 'auto')
-    spacing.set(qn('w:before'), '0')
-    spacing.set(qn('w:after'), '0')
-    pPr.append(spacing)
-
-    # 无首行缩进
-    ind = OxmlElement('w:ind')
-    ind.set(qn('w:firstLine'), '0')
-    pPr.append(ind)
-
-    run = p.add_run()
-    inline = run.add_picture(image_path, width=Cm(max_width_cm))
-
-    # 按宽度上限等比缩放
-    max_w = Cm(max_width_cm)
-    if inline.width > max_w:
-        ratio = max_w / inline.width
-        inline.width = int(inline.width * ratio)
-        inline.height = int(inline.height * ratio)
-
-    return p
+    referenced = set(doc.element.xpath('//@r:embed | //@r:link | //@r:id'))
+    rels = doc.part.rels
+    unused = [rId for rId, rel in rels.items()
+              if rel.reltype == RT.IMAGE and rId not in referenced]
+    for rId in unused:
+        del rels[rId]
+    return len(unused)
 
 
 def parse_figure_arg(fig_str):
@@ -162,56 +139,76 @@ def parse_figure_arg(fig_str):
     return fig_num, path
 
 
+def load_figures_manifest(manifest_path):
+    """
+    读取附图清单（如 05_diagrams/figures.json），返回 (摘要附图列表, 说明书附图列表)。
+
+    清单格式:
+        {"abstract_figures": ["1:structural_diagrams/fig1.png"],
+         "description_figures": ["1:structural_diagrams/fig1.png", "2:flowcharts/fig2.png"]}
+    每项与 --figures 相同，为 "图号:文件路径"；相对路径以清单所在目录为基准。
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    result = []
+    for key in ('abstract_figures', 'description_figures'):
+        figures = []
+        for fig_str in data.get(key, []):
+            fig_num, sep, path = fig_str.partition(':')
+            if sep:
+                fig_str = f'{fig_num}:{os.path.join(base_dir, path.strip())}'
+            figures.append(parse_figure_arg(fig_str))
+        result.append(figures)
+    return tuple(result)
+
+
 # ---------------------------------------------------------------------------
 # Section inserters
 # ---------------------------------------------------------------------------
 
-def insert_into_section_1(doc, figures):
+def insert_into_section_1(doc, figures, index=None, pictures=None):
     """
     Section 1: 摘要附图。
     仅插入图片（通常只有一张），无图号标签。
-    插入位置：sectPr 段落之前。
+    插入位置：sectPr 段落之前。index 为已建立的 SectionIndex（可选），
+    pictures 为共用的 PictureInserter（可选，缺省新建一个、嵌入原图）。
     """
-    sections = find_section_boundaries(doc)
-    sec_start, sec_end, sectpr_idx = sections[1]
-    sectpr_para = doc.paragraphs[sectpr_idx]._element
+    if index is None:
+        index = SectionIndex.from_document(doc)
+    if pictures is None:
+        pictures = PictureInserter(doc)
 
     for fig_num, fig_path in figures:
-        pic_p = add_picture_paragraph(doc, fig_path)
-        pic_elem = pic_p._element
-        pic_elem.getparent().remove(pic_elem)
-        sectpr_para.addprevious(pic_elem)
+        index.append(1, pictures.paragraph(fig_path))
 
     print(f'  Section 1 (摘要附图): 已插入 {len(figures)} 张图片')
 
 
-def insert_into_section_4(doc, figures):
+def insert_into_section_4(doc, figures, index=None, pictures=None):
     """
     Section 4: 说明书附图。
     每张图前加居中图号标签，按传入顺序插入。
-    插入位置：body 级 sectPr 之前。
+    插入位置：body 级 sectPr 之前。index、pictures 同 insert_into_section_1。
     """
-    body = doc.element.body
-    body_sectpr = body.find(qn('w:sectPr'))
+    if index is None:
+        index = SectionIndex.from_document(doc)
+    if pictures is None:
+        pictures = PictureInserter(doc)
 
     for fig_num, fig_path in figures:
         # 图号标签（居中）
-        label_p = make_text_paragraph(f'图{fig_num}', center=True)
-        body_sectpr.addprevious(label_p)
+        index.append(4, make_text_paragraph(f'图{fig_num}', center=True))
 
         # 空段落
-        empty_p = make_text_paragraph('', center=False)
-        body_sectpr.addprevious(empty_p)
+        index.append(4, make_text_paragraph('', center=False))
 
         # 图片
-        pic_p = add_picture_paragraph(doc, fig_path)
-        pic_elem = pic_p._element
-        pic_elem.getparent().remove(pic_elem)
-        body_sectpr.addprevious(pic_elem)
+        index.append(4, pictures.paragraph(fig_path))
 
         # 图后空段落
-        empty_p2 = make_text_paragraph('', center=False)
-        body_sectpr.addprevious(empty_p2)
+        index.append(4, make_text_paragraph('', center=False))
 
     print(f'  Section 4 (说明书附图): 已插入 {len(figures)} 张图片')
 
@@ -229,6 +226,10 @@ def main():
                         help='目标 Section: 1=摘要附图, 4=说明书附图')
     parser.add_argument('--figures', required=True, nargs='+',
                         help='附图列表，格式: "图号:文件路径"，可传入多个')
+    parser.add_argument('--figure-mode', choices=FIGURE_MODES, default=DEFAULT_FIGURE_MODE,
+                        help='附图预处理: gray=缩放并转灰度, bw=1 位黑白, original=原图嵌入')
+    parser.add_argument('--figure-dpi', type=int, default=DEFAULT_DPI,
+                        help='17cm 宽度对应的目标分辨率（默认 300 dpi）')
 
     args = parser.parse_args()
 
@@ -241,24 +242,25 @@ def main():
     print(f'正在加载: {args.docx}')
     doc = Document(args.docx)
 
-    sections = find_section_boundaries(doc)
-    if len(sections) != 5:
-        print(f'错误: 文档应有 5 个 section，实际有 {len(sections)} 个',
+    index = SectionIndex.from_document(doc)
+    if len(index) != 5:
+        print(f'错误: 文档应有 5 个 section，实际有 {len(index)} 个',
               file=sys.stderr)
         sys.exit(1)
 
     print(f'正在插入附图到 Section {args.section}...')
+    images = prepare_images([path for _, path in figures], args.figure_mode, args.figure_dpi)
+    pictures = PictureInserter(doc, images)
     if args.section == 1:
-        insert_into_section_1(doc, figures)
+        insert_into_section_1(doc, figures, index, pictures)
     elif args.section == 4:
-        insert_into_section_4(doc, figures)
+        insert_into_section_4(doc, figures, index, pictures)
 
     doc.save(args.docx)
     print(f'已保存: {args.docx}')
 
-    # 统计
-    result_doc = Document(args.docx)
-    total_images = len(result_doc.inline_shapes)
+    # 统计（直接取内存中的文档，无需重新加载）
+    total_images = len(doc.inline_shapes)
     print(f'文档中共有 {total_images} 张图片')
 
 
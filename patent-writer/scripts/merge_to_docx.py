@@ -4,7 +4,8 @@ merge_to_docx.py - 基于 Word 模板生成专利申请文件（纯文本部分
 
 将 abstract.md, claims.md, description.md 填充到专利申请模板的
 Section 0（说明书摘要）、Section 2（权利要求书）、Section 3（说明书）中。
-Section 1（摘要附图）和 Section 4（说明书附图）留空，由后续步骤插入附图。
+Section 1（摘要附图）和 Section 4（说明书附图）留空，由后续步骤插入附图；
+传入 --figures-manifest 时则在同一次加载/保存中一并插入全部附图。
 
 用法:
     python3 merge_to_docx.py \
@@ -12,78 +13,64 @@ Section 1（摘要附图）和 Section 4（说明书附图）留空，由后续
         --abstract "04_content/abstract.md" \
         --claims "04_content/claims.md" \
         --description "04_content/description.md" \
+        [--figures-manifest "05_diagrams/figures.json"] \
         --output "06_final/patent_application.docx"
+
+附图清单格式见 insert_diagrams.load_figures_manifest。附图嵌入前默认缩放到
+17cm × 300 dpi 并转灰度（--figure-mode / --figure-dpi，见 figure_images.py）。
+
+传入 --incremental 时，在输出文件旁记录各部分输入的哈希（见 section_hashes.py），
+下次运行只把输入有变化的部分重新填入已有的输出文件，未变化时直接跳过。
+
+传入 --stream 时，description.md 逐行解析，说明书段落逐个序列化后直接写入
+输出 docx 的 word/document.xml，不在内存中构建说明书的完整段落树；模板的
+页眉、页脚、sectPr 等其余部件原样复制。内存占用与说明书长度无关。
 """
 
 import argparse
+import io
 import os
 import re
+import shutil
 import sys
+import zipfile
 
 from docx import Document
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
+from docx.oxml.ns import nsmap
+from lxml import etree
+
+from docx_format import new_paragraph, new_run
+from docx_sections import SectionIndex
+from figure_images import DEFAULT_DPI, DEFAULT_FIGURE_MODE, FIGURE_MODES, prepare_images
+from insert_diagrams import (
+    PictureInserter,
+    drop_unused_images,
+    insert_into_section_1,
+    insert_into_section_4,
+    load_figures_manifest,
+)
+from section_hashes import PARTS, changed_parts, input_hashes, load_manifest, save_manifest
+from template_cache import (
+    DEFAULT_SKELETON_DIR,
+    SKELETON_VERSION,
+    skeleton_document,
+    template_digest,
+)
 
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def find_section_boundaries(doc):
-    """
-    找到每个 Section 的段落索引范围。
-
-    返回: [(start_idx, end_idx, sectPr_paragraph_idx_or_None), ...]
-    前 N-1 个 section 的边界由段落内嵌 w:sectPr 定义，
-    最后一个 section 的 sectPr 在 body 级别。
-    """
-    paragraphs = doc.paragraphs
-    boundaries = []
-    for i, p in enumerate(paragraphs):
-        pPr = p._element.find(qn('w:pPr'))
-        if pPr is not None and pPr.find(qn('w:sectPr')) is not None:
-            boundaries.append(i)
-
-    sections = []
-    start = 0
-    for b in boundaries:
-        sections.append((start, b, b))
-        start = b + 1
-    sections.append((start, len(paragraphs) - 1, None))
-    return sections
-
-
 def make_paragraph_element(text='', bold=False, center=False,
                            first_line_indent=True, font_size_pt=14):
     """
     创建一个新的 w:p 元素，带标准专利格式。
 
     格式规范: 宋体/Times New Roman, 14pt, 行距 26pt 固定值,
-    首行缩进 28pt (可选)。
+    首行缩进 28pt (可选)。格式片段取自 docx_format 的缓存原型。
     """
-    p = OxmlElement('w:p')
-    pPr = OxmlElement('w:pPr')
-
-    # 行距: 26pt 固定值 = 520 twips
-    spacing = OxmlElement('w:spacing')
-    spacing.set(qn('w:line'), '520')
-    spacing.set(qn('w:lineRule'), 'exact')
-    spacing.set(qn('w:before'), '0')
-    spacing.set(qn('w:after'), '0')
-    pPr.append(spacing)
-
-    # 缩进
-    ind = OxmlElement('w:ind')
-    ind.set(qn('w:firstLine'), '560' if first_line_indent else '0')
-    pPr.append(ind)
-
-    # 对齐
-    if center:
-        jc = OxmlElement('w:jc')
-        jc.set(qn('w:val'), 'center')
-        pPr.append(jc)
-
-    p.append(pPr)
+    p = new_paragraph(first_line_indent=first_line_indent, center=center)
 
     if text:
         _add_runs_to_paragraph(p, text, bold, font_size_pt)
@@ -103,58 +90,7 @@ def _add_runs_to_paragraph(p_elem, text, bold=False, font_size_pt=14):
             is_bold = True
             actual_text = part[2:-2]
 
-        r = OxmlElement('w:r')
-        rPr = OxmlElement('w:rPr')
-
-        rFonts = OxmlElement('w:rFonts')
-        rFonts.set(qn('w:ascii'), 'Times New Roman')
-        rFonts.set(qn('w:hAnsi'), 'Times New Roman')
-        rFonts.set(qn('w:eastAsia'), '宋体')
-        rPr.append(rFonts)
-
-        sz = OxmlElement('w:sz')
-        sz.set(qn('w:val'), str(font_size_pt * 2))
-        rPr.append(sz)
-        szCs = OxmlElement('w:szCs')
-        szCs.set(qn('w:val'), str(font_size_pt * 2))
-        rPr.append(szCs)
-
-        if is_bold:
-            b = OxmlElement('w:b')
-            rPr.append(b)
-            bCs = OxmlElement('w:bCs')
-            rPr.append(bCs)
-
-        r.append(rPr)
-
-        t = OxmlElement('w:t')
-        t.set(qn('xml:space'), 'preserve')
-        t.text = actual_text
-        r.append(t)
-
-        p_elem.append(r)
-
-
-def _collect_and_remove(doc, sec_start, sec_end, sectpr_idx):
-    """收集并删除一个 section 内的非 sectPr 段落，返回 sectPr 段落元素。"""
-    sectpr_para = doc.paragraphs[sectpr_idx]._element
-    to_remove = []
-    for i in range(sec_start, sec_end + 1):
-        if i == sectpr_idx:
-            continue
-        to_remove.append(doc.paragraphs[i]._element)
-    for elem in to_remove:
-        elem.getparent().remove(elem)
-    return sectpr_para
-
-
-def _clear_last_section(doc, sec_start, sec_end):
-    """清空最后一个 section 的段落（body 级 sectPr，不在段落内）。"""
-    to_remove = []
-    for i in range(sec_start, sec_end + 1):
-        to_remove.append(doc.paragraphs[i]._element)
-    for elem in to_remove:
-        elem.getparent().remove(elem)
+        p_elem.append(new_run(actual_text, bold=is_bold, font_size_pt=font_size_pt))
 
 
 # ---------------------------------------------------------------------------
@@ -213,84 +149,94 @@ def parse_claims(filepath):
     return claims
 
 
-def parse_description(filepath):
+def iter_description(filepath):
     """
-    解析 description.md。
-    返回 {'invention_name': str, 'sections': [{'title', 'level', 'paragraphs'}, ...]}
+    逐行解析 description.md，按出现顺序产出事件:
+        ('name', 发明名称)、('title', 标题, 级别)、('para', 段落文本)
+    不把整个文件读入内存。
     """
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    lines = content.split('\n')
-    result = {'invention_name': '', 'sections': []}
-    current_section = None
+    current_section = False
     in_invention_name = False
     invention_name_next = False
 
-    for line in lines:
-        stripped = line.strip()
-
-        if stripped.startswith('# ') and not stripped.startswith('## '):
-            continue
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            stripped = line.strip()
 
-        if stripped.startswith('## '):
-            title = stripped[3:].strip()
-            if title == '发明名称':
-                in_invention_name = True
-                invention_name_next = True
+            if stripped.startswith('# ') and not stripped.startswith('## '):
                 continue
-            else:
-                in_invention_name = False
-                if current_section:
-                    result['sections'].append(current_section)
-                current_section = {'title': title, 'level': 2, 'paragraphs': []}
+
+            if stripped.startswith('## '):
+                title = stripped[3:].strip()
+                if title == '发明名称':
+                    in_invention_name = True
+                    invention_name_next = True
+                else:
+                    in_invention_name = False
+                    current_section = True
+                    yield ('title', title, 2)
                 continue
 
-        if stripped.startswith('### '):
-            title = stripped[4:].strip()
-            if current_section:
-                result['sections'].append(current_section)
-            current_section = {'title': title, 'level': 3, 'paragraphs': []}
-            continue
+            if stripped.startswith('### '):
+                current_section = True
+                yield ('title', stripped[4:].strip(), 3)
+                continue
 
-        if in_invention_name and invention_name_next and stripped:
-            result['invention_name'] = stripped
-            invention_name_next = False
-            continue
+            if in_invention_name and invention_name_next and stripped:
+                invention_name_next = False
+                yield ('name', stripped)
+                continue
 
-        if current_section is not None and stripped:
-            current_section['paragraphs'].append(stripped)
+            if current_section and stripped:
+                yield ('para', stripped)
 
-    if current_section:
-        result['sections'].append(current_section)
 
+def parse_description(filepath):
+    """
+    解析 description.md。
+    返回 {'invention_name': str, 'sections': [{'title', 'level', 'paragraphs'}, ...]}
+    """
+    result = {'invention_name': '', 'sections': []}
+    for event in iter_description(filepath):
+        if event[0] == 'name':
+            result['invention_name'] = event[1]
+        elif event[0] == 'title':
+            result['sections'].append({'title': event[1], 'level': event[2], 'paragraphs': []})
+        else:
+            result['sections'][-1]['paragraphs'].append(event[1])
     return result
 
 
+def scan_description(filepath):
+    """逐行扫描 description.md，返回 (发明名称, 章节数)，供流式写出使用。"""
+    invention_name, section_count = '', 0
+    for event in iter_description(filepath):
+        if event[0] == 'name':
+            invention_name = event[1]
+        elif event[0] == 'title':
+            section_count += 1
+    return invention_name, section_count
+
+
 # ---------------------------------------------------------------------------
 # Section Fillers
 # ---------------------------------------------------------------------------
 
-def fill_section_0_abstract(doc, sections_info, abstract_text):
+def fill_section_0_abstract(index, abstract_text):
     """Section 0: 说明书摘要"""
-    sec_start, sec_end, sectpr_idx = sections_info[0]
-    sectpr_para = _collect_and_remove(doc, sec_start, sec_end, sectpr_idx)
+    index.clear(0)
     p = make_paragraph_element(abstract_text, first_line_indent=True)
-    sectpr_para.addprevious(p)
+    index.append(0, p)
 
 
-def fill_section_1_clear(doc):
+def fill_section_1_clear(index):
     """Section 1: 摘要附图 — 清空模板占位内容，留空待后续插入。"""
-    sections = find_section_boundaries(doc)
-    sec_start, sec_end, sectpr_idx = sections[1]
-    _collect_and_remove(doc, sec_start, sec_end, sectpr_idx)
+    index.clear(1)
 
 
-def fill_section_2_claims(doc, claims):
+def fill_section_2_claims(index, claims):
     """Section 2: 权利要求书"""
-    sections = find_section_boundaries(doc)
-    sec_start, sec_end, sectpr_idx = sections[2]
-    sectpr_para = _collect_and_remove(doc, sec_start, sec_end, sectpr_idx)
+    index.clear(2)
 
     for claim_num, claim_text in claims:
         paragraphs = claim_text.split('\n')
@@ -308,56 +254,206 @@ def fill_section_2_claims(doc, claims):
 
         for para_text in merged:
             p = make_paragraph_element(para_text, first_line_indent=False)
-            sectpr_para.addprevious(p)
+            index.append(2, p)
 
         empty_p = make_paragraph_element('', first_line_indent=False)
-        sectpr_para.addprevious(empty_p)
-
+        index.append(2, empty_p)
 
-def fill_section_3_description(doc, desc_data):
-    """Section 3: 说明书"""
-    sections = find_section_boundaries(doc)
-    sec_start, sec_end, sectpr_idx = sections[3]
-    sectpr_para = _collect_and_remove(doc, sec_start, sec_end, sectpr_idx)
 
+def description_paragraphs(invention_name, events):
+    """按说明书格式逐个产出段落元素；events 为 iter_description 的 title/para 事件。"""
     # 发明名称（居中加粗）
-    name_p = make_paragraph_element(
-        desc_data['invention_name'],
+    yield make_paragraph_element(
+        invention_name,
         bold=True, center=True, first_line_indent=False
     )
-    sectpr_para.addprevious(name_p)
 
     # 各子节
-    for section in desc_data['sections']:
-        title_p = make_paragraph_element(
-            section['title'], bold=True, first_line_indent=False
-        )
-        sectpr_para.addprevious(title_p)
-
-        for para_text in section['paragraphs']:
+    for event in events:
+        if event[0] == 'title':
+            yield make_paragraph_element(
+                event[1], bold=True, first_line_indent=False
+            )
+        elif event[0] == 'para':
+            para_text = event[1]
             if re.match(r'^\*\*.*\*\*$', para_text):
                 clean = para_text.strip('*').strip()
-                content_p = make_paragraph_element(
+                yield make_paragraph_element(
                     clean, bold=True, first_line_indent=False
                 )
             else:
-                content_p = make_paragraph_element(
+                yield make_paragraph_element(
                     para_text, first_line_indent=True
                 )
-            sectpr_para.addprevious(content_p)
 
 
-def fill_section_4_clear(doc):
+def _section_events(desc_data):
+    for section in desc_data['sections']:
+        yield ('title', section['title'], section['level'])
+        for para_text in section['paragraphs']:
+            yield ('para', para_text)
+
+
+def fill_section_3_description(index, desc_data):
+    """Section 3: 说明书"""
+    index.clear(3)
+    for p in description_paragraphs(desc_data['invention_name'], _section_events(desc_data)):
+        index.append(3, p)
+
+
+def fill_section_4_clear(index):
     """Section 4: 说明书附图 — 清空模板占位内容，留空待后续插入。"""
-    sections = find_section_boundaries(doc)
-    sec_start, sec_end, sectpr_idx = sections[4]
-    _clear_last_section(doc, sec_start, sec_end)
+    index.clear(4)
 
 
 # ---------------------------------------------------------------------------
-# Main
+# Streaming writer
 # ---------------------------------------------------------------------------
 
+DESCRIPTION_SENTINEL = ' patent-writer:description '
+_W_NS_DECL = f' xmlns:w="{nsmap["w"]}"'
+
+
+def _serialize_paragraph(p):
+    """
+    序列化单个段落。独立序列化时 lxml 会在根元素上重复声明 w 命名空间，
+    而 document.xml 根元素已声明，故去掉这一处冗余声明。
+    """
+    xml = etree.tostring(p, encoding='unicode')
+    return xml.replace(_W_NS_DECL, '', 1).encode('utf-8')
+
+
+def save_streaming(doc, index, paragraphs, output_path):
+    """
+    以流式方式保存：Section 3 的段落由 paragraphs 迭代器逐个产生并直接写入。
+
+    先在 Section 3 中放一个注释占位，保存不含说明书正文的骨架；再逐个复制
+    骨架 zip 中的部件到输出文件，写 word/document.xml 时在占位处依次写入
+    每个段落。返回写入的段落数。
+    """
+    index.clear(3)
+    sentinel = etree.Comment(DESCRIPTION_SENTINEL)
+    index.anchor(3).addprevious(sentinel)
+    marker = etree.tostring(sentinel)
+
+    skeleton = io.BytesIO()
+    doc.save(skeleton)
+    sentinel.getparent().remove(sentinel)
+
+    count = 0
+    with zipfile.ZipFile(skeleton) as zin, \
+            zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            out_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+            out_info.compress_type = info.compress_type
+            out_info.external_attr = info.external_attr
+
+            if info.filename != 'word/document.xml':
+                with zin.open(info) as src, zout.open(out_info, 'w') as dst:
+                    shutil.copyfileobj(src, dst)
+                continue
+
+            head, found, tail = zin.read(info).partition(marker)
+            if not found:
+                raise RuntimeError('骨架 document.xml 中未找到说明书占位')
+            with zout.open(out_info, 'w') as dst:
+                dst.write(head)
+                for p in paragraphs:
+                    dst.write(_serialize_paragraph(p))
+                    count += 1
+                dst.write(tail)
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Assembly
+# ---------------------------------------------------------------------------
+
+def assemble(doc, abstract_path, claims_path, description_path, output_path,
+             figures_manifest=None, stream=False,
+             figure_mode=DEFAULT_FIGURE_MODE, figure_dpi=DEFAULT_DPI, parts=PARTS):
+    """
+    把三份 markdown（及可选的附图清单）填入已加载的模板 doc 并保存到 output_path。
+    parts 为需要（重新）填充的部分，增量重建时只传入有变化的部分，其余 Section
+    保持 doc 中已有的内容。
+    返回流式写出的说明书段落数（非流式模式为 0）。模板结构不符时抛出 ValueError。
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    # 段落索引只建立一次，之后的清空/插入都在索引上增量进行
+    index = SectionIndex.from_document(doc)
+    if len(index) != 5:
+        raise ValueError(f'模板应有 5 个 section，实际有 {len(index)} 个')
+
+    print('正在解析输入文件...')
+    if 'abstract' in parts:
+        abstract_text = parse_abstract(abstract_path)
+        print(f'  摘要: {len(abstract_text)} 字')
+    if 'claims' in parts:
+        claims = parse_claims(claims_path)
+        print(f'  权利要求: {len(claims)} 条')
+    stream_description = stream and 'description' in parts
+    if stream_description:
+        # 流式模式只预先扫描发明名称与章节数，正文在保存时逐行读取
+        invention_name, section_count = scan_description(description_path)
+        print(f'  说明书章节: {section_count} 节')
+    elif 'description' in parts:
+        desc_data = parse_description(description_path)
+        print(f'  说明书章节: {len(desc_data["sections"])} 节')
+
+    abstract_figures, description_figures = [], []
+    if 'figures' in parts and figures_manifest:
+        abstract_figures, description_figures = load_figures_manifest(figures_manifest)
+        print(f'  附图: 摘要附图 {len(abstract_figures)} 张，说明书附图 {len(description_figures)} 张')
+
+    if 'abstract' in parts:
+        print('正在填充 Section 0: 说明书摘要...')
+        fill_section_0_abstract(index, abstract_text)
+
+    if 'figures' in parts:
+        print('正在清空 Section 1: 摘要附图（待后续插入）...')
+        fill_section_1_clear(index)
+
+    if 'claims' in parts:
+        print('正在填充 Section 2: 权利要求书...')
+        fill_section_2_claims(index, claims)
+
+    if 'description' in parts and not stream_description:
+        print('正在填充 Section 3: 说明书...')
+        fill_section_3_description(index, desc_data)
+
+    if 'figures' in parts:
+        print('正在清空 Section 4: 说明书附图（待后续插入）...')
+        fill_section_4_clear(index)
+
+    if 'figures' in parts and figures_manifest:
+        print('正在插入附图...')
+        images = prepare_images(
+            [path for _, path in abstract_figures + description_figures],
+            figure_mode, figure_dpi,
+        )
+        # 两个附图 Section 共用一个 PictureInserter，同一张图只注册一次
+        pictures = PictureInserter(doc, images)
+        if abstract_figures:
+            insert_into_section_1(doc, abstract_figures, index, pictures)
+        if description_figures:
+            insert_into_section_4(doc, description_figures, index, pictures)
+    if 'figures' in parts:
+        dropped = drop_unused_images(doc)
+        if dropped:
+            print(f'  已移除 {dropped} 张不再引用的旧图片')
+
+    print(f'正在保存: {output_path}')
+    if stream_description:
+        print('正在流式写出 Section 3: 说明书...')
+        events = (e for e in iter_description(description_path) if e[0] != 'name')
+        return save_streaming(
+            doc, index, description_paragraphs(invention_name, events), output_path
+        )
+    doc.save(output_path)
+    return 0
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='基于 Word 模板生成专利申请文件（纯文本部分）'
@@ -366,7 +462,19 @@ def main():
     parser.add_argument('--abstract', required=True, help='abstract.md 路径')
     parser.add_argument('--claims', required=True, help='claims.md 路径')
     parser.add_argument('--description', required=True, help='description.md 路径')
+    parser.add_argument('--figures-manifest', default=None,
+                        help='附图清单 JSON（如 05_diagrams/figures.json），传入则同时插入附图')
+    parser.add_argument('--figure-mode', choices=FIGURE_MODES, default=DEFAULT_FIGURE_MODE,
+                        help='附图预处理: gray=缩放并转灰度, bw=1 位黑白, original=原图嵌入')
+    parser.add_argument('--figure-dpi', type=int, default=DEFAULT_DPI,
+                        help='17cm 宽度对应的目标分辨率（默认 300 dpi）')
     parser.add_argument('--output', required=True, help='输出 .docx 路径')
+    parser.add_argument('--stream', action='store_true',
+                        help='逐行解析说明书并流式写出 document.xml（适合超长说明书）')
+    parser.add_argument('--no-template-cache', action='store_true',
+                        help='不读写预编译的模板骨架，每次重新解析并校验模板')
+    parser.add_argument('--incremental', action='store_true',
+                        help='只重新填充输入有变化的部分（哈希记录在输出旁的 .sections.json）')
 
     args = parser.parse_args()
 
@@ -375,55 +483,62 @@ def main():
         (args.abstract, 'abstract.md'),
         (args.claims, 'claims.md'),
         (args.description, 'description.md'),
-    ]:
+    ] + ([(args.figures_manifest, '附图清单')] if args.figures_manifest else []):
         if not os.path.exists(path):
             print(f'错误: {name}不存在: {path}', file=sys.stderr)
             sys.exit(1)
 
-    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
-
-    print('正在解析输入文件...')
-    abstract_text = parse_abstract(args.abstract)
-    claims = parse_claims(args.claims)
-    desc_data = parse_description(args.description)
-
-    print(f'  摘要: {len(abstract_text)} 字')
-    print(f'  权利要求: {len(claims)} 条')
-    print(f'  说明书章节: {len(desc_data["sections"])} 节')
-
-    print('正在加载模板...')
-    doc = Document(args.template)
-
-    sections = find_section_boundaries(doc)
-    if len(sections) != 5:
-        print(f'错误: 模板应有 5 个 section，实际有 {len(sections)} 个',
-              file=sys.stderr)
+    parts, full = PARTS, True
+    if args.incremental:
+        figures = load_figures_manifest(args.figures_manifest) if args.figures_manifest else None
+        hashes = input_hashes(
+            f'{template_digest(args.template)}-v{SKELETON_VERSION}',
+            args.abstract, args.claims, args.description, figures,
+            {'figure_mode': args.figure_mode, 'figure_dpi': args.figure_dpi},
+        )
+        parts = changed_parts(load_manifest(args.output), hashes, args.output)
+        if parts == []:
+            print(f'输入未变化，跳过重建: {args.output}')
+            return
+        if parts is None:
+            print('增量重建: 无可用的上次记录（或模板、参数、输出文件已变化），整体重建')
+            parts = PARTS
+        else:
+            full = False
+            print(f'增量重建: 仅重新填充 {", ".join(parts)}')
+
+    try:
+        if full:
+            print('正在加载模板...')
+            doc = skeleton_document(
+                args.template, None if args.no_template_cache else DEFAULT_SKELETON_DIR
+            )
+        else:
+            print(f'正在加载已有输出: {args.output}')
+            doc = Document(args.output)
+        streamed = assemble(
+            doc, args.abstract, args.claims, args.description, args.output,
+            figures_manifest=args.figures_manifest, stream=args.stream,
+            figure_mode=args.figure_mode, figure_dpi=args.figure_dpi, parts=parts,
+        )
+    except ValueError as e:
+        print(f'错误: {e}', file=sys.stderr)
         sys.exit(1)
 
-    print('正在填充 Section 0: 说明书摘要...')
-    fill_section_0_abstract(doc, sections, abstract_text)
-
-    print('正在清空 Section 1: 摘要附图（待后续插入）...')
-    fill_section_1_clear(doc)
-
-    print('正在填充 Section 2: 权利要求书...')
-    fill_section_2_claims(doc, claims)
-
-    print('正在填充 Section 3: 说明书...')
-    fill_section_3_description(doc, desc_data)
-
-    print('正在清空 Section 4: 说明书附图（待后续插入）...')
-    fill_section_4_clear(doc)
+    if args.incremental:
+        save_manifest(args.output, hashes)
 
-    print(f'正在保存: {args.output}')
-    doc.save(args.output)
-    print('完成！文本内容已填充，附图 Section 留空待后续步骤插入。')
+    if args.figures_manifest:
+        print('完成！文本内容与附图均已写入。')
+    else:
+        print('完成！文本内容已填充，附图 Section 留空待后续步骤插入。')
 
-    result_doc = Document(args.output)
+    # 统计（直接取内存中的文档，无需重新加载）
     print(f'\n输出文件统计:')
-    print(f'  段落数: {len(result_doc.paragraphs)}')
-    print(f'  Section 数: {len(result_doc.sections)}')
-    for i, sec in enumerate(result_doc.sections):
+    print(f'  段落数: {len(doc.paragraphs) + streamed}')
+    print(f'  图片数: {len(doc.inline_shapes)}')
+    print(f'  Section 数: {len(doc.sections)}')
+    for i, sec in enumerate(doc.sections):
         header_text = ''.join(p.text for p in sec.header.paragraphs)
         print(f'  Section {i} 页眉: {header_text}')
 
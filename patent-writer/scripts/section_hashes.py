@@ -0,0 +1,107 @@
+"""
+section_hashes.py - 增量重建用的分节内容哈希
+
+merge_to_docx.py --incremental 在输出文件旁写一份清单
+（06_final/patent_application.sections.json），记录每个部分输入的 sha256：
+
+    abstract     abstract.md                 -> Section 0
+    claims       claims.md                   -> Section 2
+    description  description.md              -> Section 3
+    figures      附图清单及其引用的每个图片文件 -> Section 1、4
+
+以及模板、附图预处理参数和输出文件本身的哈希。下次运行时只重新填充输入有
+变化的部分；模板或参数变化、输出文件被外部修改、清单缺失或损坏时整体重建。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+MANIFEST_VERSION = 1
+
+PARTS = ('abstract', 'claims', 'description', 'figures')
+
+
+def manifest_path(output_path):
+    return os.path.splitext(output_path)[0] + '.sections.json'
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _json_digest(value):
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def figures_digest(abstract_figures, description_figures):
+    """附图哈希：图号、所在 Section 与图片内容都参与计算（路径不参与）。"""
+    return _json_digest({
+        'abstract': [(num, file_digest(path)) for num, path in abstract_figures],
+        'description': [(num, file_digest(path)) for num, path in description_figures],
+    })
+
+
+def input_hashes(template_digest, abstract_path, claims_path, description_path,
+                 figures, options):
+    """
+    计算本次输入的哈希。figures 为 (摘要附图, 说明书附图) 或 None（不插入附图），
+    options 为影响输出的其余参数（如附图预处理方式）。
+    """
+    return {
+        'version': MANIFEST_VERSION,
+        'template': template_digest,
+        'options': _json_digest(options),
+        'parts': {
+            'abstract': file_digest(abstract_path),
+            'claims': file_digest(claims_path),
+            'description': file_digest(description_path),
+            'figures': figures_digest(*figures) if figures is not None else None,
+        },
+    }
+
+
+def load_manifest(output_path):
+    """读取上次的清单；不存在或损坏时返回 None。"""
+    try:
+        with open(manifest_path(output_path), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def save_manifest(output_path, hashes):
+    """记录本次输入的哈希与输出文件的哈希，经临时文件原子替换。"""
+    data = dict(hashes, output=file_digest(output_path))
+    path = manifest_path(output_path)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def changed_parts(previous, hashes, output_path):
+    """
+    对比上次清单与本次哈希，返回需要重新填充的部分列表（空列表表示无需重建）；
+    需要整体重建时返回 None。
+    """
+    if previous is None or not os.path.exists(output_path):
+        return None
+    for key in ('version', 'template', 'options'):
+        if previous.get(key) != hashes[key]:
+            return None
+    if previous.get('output') != file_digest(output_path):
+        return None
+    old_parts = previous.get('parts') or {}
+    return [part for part in PARTS if old_parts.get(part) != hashes['parts'][part]]
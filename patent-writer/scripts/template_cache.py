@@ -0,0 +1,119 @@
+"""
+template_cache.py - 专利申请模板骨架缓存
+
+merge_to_docx.py 与 batch_merge.py 共用。模板只在第一次使用时解析并校验
+（5 个 Section），同时清空各 Section 的占位段落，得到"骨架"：
+
+- 进程内：骨架按模板内容的 sha256 缓存，每次合并从骨架深拷贝一份新文档，
+  不再重复解压、解析模板 XML。
+- 跨进程：骨架另存为 {缓存目录}/templates/{sha256}-v{版本}.docx，之后的
+  进程直接加载这份已校验、已清空的骨架，跳过校验与清空。模板内容一变
+  哈希即变，旧骨架自然失效。
+
+缓存目录默认 ~/.cache/patent-writer，可用 PATENT_WRITER_CACHE_DIR 修改。
+"""
+
+import copy
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from docx import Document
+
+from docx_sections import SectionIndex
+
+DEFAULT_CACHE_ROOT = Path(
+    os.environ.get('PATENT_WRITER_CACHE_DIR')
+    or Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'patent-writer'
+)
+DEFAULT_SKELETON_DIR = DEFAULT_CACHE_ROOT / 'templates'
+
+# 骨架的生成逻辑变化时递增，使旧的骨架文件失效
+SKELETON_VERSION = 1
+SECTION_COUNT = 5
+
+_skeletons = {}
+
+
+def template_digest(template_path):
+    with open(template_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_skeleton(template_path):
+    """解析并校验模板，清空全部 Section 的占位段落。模板结构不符时抛出 ValueError。"""
+    doc = Document(template_path)
+    index = SectionIndex.from_document(doc)
+    if len(index) != SECTION_COUNT:
+        raise ValueError(f'模板应有 {SECTION_COUNT} 个 section，实际有 {len(index)} 个')
+    for i in range(len(index)):
+        index.clear(i)
+    return doc
+
+
+def _skeleton_path(digest, skeleton_dir):
+    return Path(skeleton_dir) / f'{digest}-v{SKELETON_VERSION}.docx'
+
+
+def _save_skeleton(doc, path):
+    """经临时文件与 os.replace 写入，并发进程不会读到不完整的骨架。写入失败时忽略。"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                doc.save(f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        pass
+
+
+def skeleton_document(template_path, skeleton_dir=DEFAULT_SKELETON_DIR):
+    """
+    返回一份可直接填充的骨架文档（单次使用，不做进程内缓存）。
+    skeleton_dir 为 None 时不读写骨架文件，每次都解析并校验模板。
+    """
+    if skeleton_dir is None:
+        return build_skeleton(template_path)
+    return _load_or_build(template_path, template_digest(template_path), skeleton_dir)
+
+
+def _load_or_build(template_path, digest, skeleton_dir):
+    path = _skeleton_path(digest, skeleton_dir)
+    if path.exists():
+        try:
+            return Document(str(path))
+        except Exception:
+            pass  # 骨架文件损坏时重新生成
+    doc = build_skeleton(template_path)
+    _save_skeleton(doc, path)
+    return doc
+
+
+class TemplateSkeleton:
+    """进程内缓存的骨架；new_document() 每次返回一份独立的深拷贝。"""
+
+    def __init__(self, doc, digest):
+        self._doc = doc
+        self.digest = digest
+
+    def new_document(self):
+        return copy.deepcopy(self._doc)
+
+
+def load_skeleton(template_path, skeleton_dir=DEFAULT_SKELETON_DIR):
+    """按模板内容返回进程内缓存的 TemplateSkeleton，首次使用时加载骨架文件或解析模板。"""
+    digest = template_digest(template_path)
+    skeleton = _skeletons.get(digest)
+    if skeleton is None:
+        if skeleton_dir is None:
+            doc = build_skeleton(template_path)
+        else:
+            doc = _load_or_build(template_path, digest, skeleton_dir)
+        skeleton = TemplateSkeleton(doc, digest)
+        _skeletons[digest] = skeleton
+    return skeleton
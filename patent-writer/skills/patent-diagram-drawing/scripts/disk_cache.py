@@ -0,0 +1,120 @@
+"""
+Patent Diagram Disk Cache - Content-Addressed File Store with LRU Eviction
+
+Small on-disk key/value store used by generate.py to skip re-requesting an
+identical Gemini image. Same module as paper-banana's disk_cache.py, with
+its own default root.
+
+Entries live at {root}/{key[:2]}/{key}. Each entry's mtime records when
+it was written and its atime records when it was last read, so eviction
+drops the least recently used entries first once the store grows past
+its size cap, and an optional TTL expires entries by age. Writes go
+through a temporary file and os.replace, so concurrent processes sharing
+a cache never observe partial entries.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from pathlib import Path
+
+DEFAULT_CACHE_ROOT = Path(
+    os.environ.get("PATENT_WRITER_CACHE_DIR")
+    or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "patent-writer"
+)
+
+
+def make_key(*parts) -> str:
+    """Hash JSON-serialisable key parts into a hex cache key."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """Content-addressed file cache bounded by total size (LRU eviction) and optional TTL."""
+
+    def __init__(self, root, max_bytes: int = 256 * 1024 * 1024, ttl=None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._size_estimate = None
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _expired(self, st) -> bool:
+        return self.ttl is not None and time.time() - st.st_mtime > self.ttl
+
+    def get(self, key: str):
+        """Return the cached bytes for key, or None on a miss or expired entry."""
+        path = self._entry_path(key)
+        try:
+            if self._expired(path.stat()):
+                path.unlink()
+                return None
+            data = path.read_bytes()
+            # Record the access for LRU while keeping the write time in mtime
+            os.utime(path, (time.time(), path.stat().st_mtime))
+        except OSError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store data under key, evicting old entries if over the size cap."""
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            try:
+                replaced = path.stat().st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        if self._size_estimate is None:
+            self._size_estimate = self._total_size()
+        else:
+            # Overwriting an entry only grows the store by the size difference
+            self._size_estimate += len(data) - replaced
+        if self._size_estimate > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """Yield (path, stat) for every cache entry."""
+        if not self.root.exists():
+            return
+        for sub in self.root.iterdir():
+            if not sub.is_dir():
+                continue
+            for path in sub.iterdir():
+                if path.name.startswith(".tmp-"):
+                    continue
+                try:
+                    yield path, path.stat()
+                except OSError:
+                    continue
+
+    def _total_size(self) -> int:
+        return sum(st.st_size for _, st in self._entries())
+
+    def evict(self):
+        """Remove expired entries, then least recently used ones until the store fits max_bytes."""
+        entries = sorted(self._entries(), key=lambda e: e[1].st_atime)
+        total = sum(st.st_size for _, st in entries)
+        for path, st in entries:
+            if total <= self.max_bytes and not self._expired(st):
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= st.st_size
+        self._size_estimate = total
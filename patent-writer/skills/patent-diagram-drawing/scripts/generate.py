@@ -9,21 +9,48 @@ and hardware cross-section diagrams.
 Usage:
     python generate.py "方法流程图 prompt..." -o flowchart.png --ratio 3:4 --size 2K -v
     python generate.py "装置结构框图 prompt..." -o structure.png --ratio 3:4 --size 2K -v
+
+Batch mode (all figures of a filing concurrently, one shared client):
+    python generate.py --batch figures.json [--concurrency 4] [--results results.json]
+
+    The batch file is a JSON list of figure jobs:
+        {"id": "fig1", "prompt": "...", "output": "flowcharts/method_flow.png",
+         "ratio": "3:4", "size": "2K", "input": "draft.png"}
+    ("ratio", "size", "input" and "id" are optional). Relative paths are
+    resolved against the batch file's directory. Each job is retried on
+    transient errors under the shared rate limiter; one failing figure does
+    not stop the others. One JSON result line is printed per finished job,
+    and all results are written to --results (default:
+    {batch stem}_results.json next to the batch file).
+
+Response cache (opt-in with --cache or GEMINI_RESPONSE_CACHE=1):
+    Images are cached on disk keyed on the model, prompt, aspect ratio,
+    image size and input image hash, so re-running a job after a text-only
+    fix makes no API calls. Entries expire after --cache-ttl-days and the
+    least recently used are evicted past --cache-max-mb. --no-cache bypasses
+    the cache even when the environment enables it.
 """
 
 import argparse
+import asyncio
 import base64
+import hashlib
+import json
 import os
 import sys
+import time
 from datetime import datetime
 from pathlib import Path
 
+from disk_cache import DEFAULT_CACHE_ROOT, DiskCache, make_key
+from rate_limit import backoff_delay, get_limiter, is_retryable, retry_after_seconds
+
 try:
     from google import genai
     from google.genai import types
 except ImportError:
-    print("Error: google-genai package not installed.")
-    print("Install with: pip install google-genai")
+    print("Error: google-genai package not installed.", file=sys.stderr)
+    print("Install with: pip install google-genai", file=sys.stderr)
     sys.exit(1)
 
 MODEL_NAME = "gemini-3-pro-image-preview"
@@ -35,17 +62,26 @@ VALID_ASPECT_RATIOS = [
 
 VALID_SIZES = ["2K", "4K"]
 
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_CONCURRENCY = 4
+
+DEFAULT_CACHE_MAX_MB = 1024
+DEFAULT_CACHE_TTL_DAYS = 30
+CACHE_ENV = "GEMINI_RESPONSE_CACHE"
+
 
 def get_api_key() -> str:
     """Get Gemini API key from environment.
 
-    Checks GEMINI_API_KEY first, falls back to GOOGLE_API_KEY.
+    Checks GEMINI_API_KEY first, falls back to GOOGLE_API_KEY. Raises
+    RuntimeError if neither is set, so a batch records the failure per job.
     """
     api_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
     if not api_key:
-        print("Error: GEMINI_API_KEY (or GOOGLE_API_KEY) environment variable not set.")
-        print("Get your API key from: https://aistudio.google.com/apikey")
-        sys.exit(1)
+        raise RuntimeError(
+            "GEMINI_API_KEY (or GOOGLE_API_KEY) environment variable not set. "
+            "Get your API key from: https://aistudio.google.com/apikey"
+        )
     return api_key
 
 
@@ -57,8 +93,8 @@ def get_base_url() -> str | None:
     return os.environ.get("GEMINI_BASE_URL") or os.environ.get("GOOGLE_API_BASE_URL")
 
 
-def load_image_as_base64(path: str) -> tuple[str, str]:
-    """Load image file and return base64 data and mime type."""
+def load_image(path: str) -> tuple[bytes, str]:
+    """Load image file and return raw bytes and mime type."""
     path = Path(path)
     if not path.exists():
         raise FileNotFoundError(f"Image file not found: {path}")
@@ -75,11 +111,44 @@ def load_image_as_base64(path: str) -> tuple[str, str]:
     mime_type = mime_types.get(ext, "image/jpeg")
 
     with open(path, "rb") as f:
-        data = base64.standard_b64encode(f.read()).decode("utf-8")
+        data = f.read()
 
     return data, mime_type
 
 
+def load_image_as_base64(path: str) -> tuple[str, str]:
+    """Load image file and return base64 data and mime type."""
+    data, mime_type = load_image(path)
+    return base64.standard_b64encode(data).decode("utf-8"), mime_type
+
+
+# Process-wide client: batch jobs share one HTTP connection pool
+_client = None
+
+
+def get_client():
+    """Return the shared Gemini client, creating it from the environment on first use."""
+    global _client
+    if _client is None:
+        api_key = get_api_key()
+        base_url = get_base_url()
+        if base_url:
+            _client = genai.Client(api_key=api_key, http_options={"base_url": base_url})
+        else:
+            _client = genai.Client(api_key=api_key)
+    return _client
+
+
+async def close_client():
+    """Close the shared client's connection pools, if one was created."""
+    global _client
+    if _client is None:
+        return
+    await _client.aio.aclose()
+    _client.close()
+    _client = None
+
+
 def generate_output_path(output_dir: str = None) -> str:
     """Generate a unique output filename."""
     if output_dir is None:
@@ -91,6 +160,233 @@ def generate_output_path(output_dir: str = None) -> str:
     return str(Path(output_dir) / f"patent_diagram_{timestamp}.png")
 
 
+def open_response_cache(enabled: bool = False, disabled: bool = False,
+                        cache_dir=None, max_mb: int = DEFAULT_CACHE_MAX_MB,
+                        ttl_days: float = DEFAULT_CACHE_TTL_DAYS):
+    """Return the response DiskCache if enabled (flag or GEMINI_RESPONSE_CACHE), else None."""
+    enabled = enabled or os.environ.get(CACHE_ENV, "").lower() in ("1", "true", "yes")
+    if disabled or not enabled:
+        return None
+    return DiskCache(
+        cache_dir or DEFAULT_CACHE_ROOT / "diagrams",
+        max_bytes=max_mb * 1024 * 1024,
+        ttl=ttl_days * 86400,
+    )
+
+
+def response_cache_key(prompt: str, aspect_ratio: str = None, image_size: str = None,
+                       input_path: str = None) -> str:
+    """Cache key for one image request: model, prompt, image config and input image hash."""
+    input_hash = None
+    if input_path:
+        input_hash = hashlib.sha256(Path(input_path).read_bytes()).hexdigest()
+    return make_key("gemini-image", MODEL_NAME, None, prompt, aspect_ratio, image_size, input_hash)
+
+
+def _log_retry(attempt: int, max_attempts: int, e: Exception, limiter):
+    """Report a failed attempt and return the local backoff to sleep, if any."""
+    hint = retry_after_seconds(e)
+    if hint is not None:
+        # Pause every job sharing the limiter, not just this one
+        limiter.penalize(hint)
+        print(f"Attempt {attempt + 1}/{max_attempts} failed: {e}. "
+              f"Server asked to retry in {hint:g}s...", file=sys.stderr)
+        return 0.0
+    delay = backoff_delay(attempt)
+    print(f"Attempt {attempt + 1}/{max_attempts} failed: {e}. "
+          f"Retrying in {delay:.1f}s...", file=sys.stderr)
+    return delay
+
+
+def generate_content_with_retry(client, contents, config, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+    """
+    Call generate_content under the shared rate limiter, retrying transient errors.
+
+    Waits out the server's retry hint when one is given (pausing every job
+    that shares the limiter), otherwise backs off exponentially with jitter.
+    Re-raises the last error once attempts run out or the error is not
+    retryable.
+    """
+    limiter = get_limiter()
+    for attempt in range(max_attempts):
+        limiter.acquire()
+        try:
+            return client.models.generate_content(
+                model=MODEL_NAME,
+                contents=contents,
+                config=config,
+            )
+        except Exception as e:
+            if attempt == max_attempts - 1 or not is_retryable(e):
+                raise
+            time.sleep(_log_retry(attempt, max_attempts, e, limiter))
+
+
+async def generate_content_with_retry_async(client, contents, config,
+                                            max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+    """Async generate_content_with_retry; waits without blocking the event loop."""
+    limiter = get_limiter()
+    for attempt in range(max_attempts):
+        await limiter.acquire_async()
+        try:
+            return await client.aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=contents,
+                config=config,
+            )
+        except Exception as e:
+            if attempt == max_attempts - 1 or not is_retryable(e):
+                raise
+            await asyncio.sleep(_log_retry(attempt, max_attempts, e, limiter))
+
+
+def validate_image_config(aspect_ratio: str = None, image_size: str = None):
+    """Return the (aspect_ratio, image_size) actually sent; invalid values are warned about and dropped."""
+    if aspect_ratio and aspect_ratio not in VALID_ASPECT_RATIOS:
+        print(f"Warning: Invalid aspect ratio '{aspect_ratio}'. Valid options: {VALID_ASPECT_RATIOS}",
+              file=sys.stderr)
+        aspect_ratio = None
+    if image_size:
+        if image_size.upper() not in VALID_SIZES:
+            print(f"Warning: Invalid size '{image_size}'. Valid options: {VALID_SIZES}",
+                  file=sys.stderr)
+            image_size = None
+        else:
+            image_size = image_size.upper()
+    return aspect_ratio or None, image_size or None
+
+
+def build_request(prompt: str, input_path: str = None, aspect_ratio: str = None,
+                  image_size: str = None):
+    """Build (contents, config) for one request from validated settings."""
+    contents = []
+    if input_path:
+        # Image editing mode
+        image_data, mime_type = load_image(input_path)
+        contents.append(types.Part.from_bytes(data=image_data, mime_type=mime_type))
+    contents.append(prompt)
+
+    image_config_dict = {}
+    if aspect_ratio:
+        image_config_dict["aspect_ratio"] = aspect_ratio
+    if image_size:
+        image_config_dict["image_size"] = image_size
+
+    if image_config_dict:
+        generate_config = types.GenerateContentConfig(
+            response_modalities=["IMAGE", "TEXT"],
+            image_config=types.ImageConfig(**image_config_dict)
+        )
+    else:
+        generate_config = types.GenerateContentConfig(
+            response_modalities=["IMAGE", "TEXT"]
+        )
+    return contents, generate_config
+
+
+def _success(output_path, prompt, aspect_ratio, image_size, input_path, cached: bool) -> dict:
+    return {
+        "success": True,
+        "path": output_path,
+        "metadata": {
+            "model": MODEL_NAME,
+            "prompt": prompt,
+            "aspect_ratio": aspect_ratio,
+            "image_size": image_size,
+            "input_image": input_path,
+            "timestamp": datetime.now().isoformat(),
+            "cached": cached,
+        }
+    }
+
+
+def _failure(error_msg: str) -> dict:
+    return {
+        "success": False,
+        "error": error_msg,
+        "path": None,
+    }
+
+
+def _exception_failure(e: Exception) -> dict:
+    error_msg = str(e)
+    if "safety" in error_msg.lower():
+        error_msg = "Content blocked by safety filters. Try rephrasing your prompt."
+    elif "quota" in error_msg.lower() or "rate" in error_msg.lower():
+        error_msg = "Rate limit exceeded. Wait a moment and try again."
+    return _failure(error_msg)
+
+
+def _prepare(prompt, output_path, input_path, aspect_ratio, image_size, cache, verbose):
+    """
+    Resolve the output path, validate settings and consult the cache.
+
+    Returns (output_path, aspect_ratio_used, image_size_used, cache_key,
+    cached_result); cached_result is a finished result dict on a cache hit.
+    """
+    if output_path is None:
+        output_path = generate_output_path()
+
+    # Ensure output directory exists
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+
+    # Only valid settings reach the request, so only they belong in the key
+    aspect_ratio_used, image_size_used = validate_image_config(aspect_ratio, image_size)
+
+    cache_key = None
+    if cache is not None:
+        cache_key = response_cache_key(prompt, aspect_ratio_used, image_size_used, input_path)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            with open(output_path, "wb") as f:
+                f.write(cached)
+            if verbose:
+                print(f"Saved (cached): {output_path}")
+            result = _success(output_path, prompt, aspect_ratio, image_size, input_path, True)
+            return output_path, aspect_ratio_used, image_size_used, cache_key, result
+
+    if verbose:
+        if input_path:
+            print(f"Input image: {input_path}")
+        print(f"Model: {MODEL_NAME}")
+        print(f"Prompt: {prompt}")
+        if aspect_ratio:
+            print(f"Aspect ratio: {aspect_ratio}")
+        if image_size:
+            print(f"Size: {image_size}")
+        print("Generating...")
+    return output_path, aspect_ratio_used, image_size_used, cache_key, None
+
+
+def _save_response(response, output_path, prompt, aspect_ratio, image_size, input_path,
+                   cache, cache_key, verbose) -> dict:
+    """Extract the image from a response, save it (and cache it) and build the result."""
+    image_data = None
+    text_response = None
+
+    for part in response.candidates[0].content.parts:
+        if part.inline_data and part.inline_data.mime_type.startswith("image/"):
+            image_data = part.inline_data.data
+        elif part.text:
+            text_response = part.text
+
+    if not image_data:
+        return _failure(text_response or "No image generated")
+
+    # Save image
+    with open(output_path, "wb") as f:
+        f.write(image_data)
+    if cache is not None:
+        cache.put(cache_key, image_data)
+
+    if verbose:
+        print(f"Saved: {output_path}")
+        if text_response:
+            print(f"Model response: {text_response}")
+
+    return _success(output_path, prompt, aspect_ratio, image_size, input_path, False)
+
+
 def generate_image(
     prompt: str,
     output_path: str = None,
@@ -98,6 +394,8 @@ def generate_image(
     aspect_ratio: str = None,
     image_size: str = None,
     verbose: bool = False,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    cache: DiskCache = None,
 ) -> dict:
     """
     Generate or edit an image using Gemini API.
@@ -109,134 +407,135 @@ def generate_image(
         aspect_ratio: Aspect ratio (1:1, 16:9, etc.)
         image_size: Resolution (2K or 4K)
         verbose: Print detailed output
+        max_attempts: API attempts before giving up on transient errors
+        cache: Response cache (see open_response_cache); None to always call the API
 
     Returns:
         dict with 'success', 'path', 'metadata'
     """
-    api_key = get_api_key()
-    base_url = get_base_url()
-    if base_url:
-        client = genai.Client(api_key=api_key, http_options={"base_url": base_url})
-    else:
-        client = genai.Client(api_key=api_key)
-
-    if output_path is None:
-        output_path = generate_output_path()
+    output_path, ratio, size, cache_key, cached = _prepare(
+        prompt, output_path, input_path, aspect_ratio, image_size, cache, verbose
+    )
+    if cached:
+        return cached
 
-    # Ensure output directory exists
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    try:
+        client = get_client()
+        contents, generate_config = build_request(prompt, input_path, ratio, size)
+        response = generate_content_with_retry(client, contents, generate_config, max_attempts)
+        return _save_response(response, output_path, prompt, aspect_ratio, image_size,
+                              input_path, cache, cache_key, verbose)
+    except Exception as e:
+        return _exception_failure(e)
 
-    # Build contents
-    contents = []
 
-    if input_path:
-        # Image editing mode
-        image_data, mime_type = load_image_as_base64(input_path)
-        contents.append(
-            types.Part.from_bytes(
-                data=base64.standard_b64decode(image_data),
-                mime_type=mime_type
-            )
-        )
-        if verbose:
-            print(f"Input image: {input_path}")
-
-    contents.append(prompt)
+async def generate_image_async(
+    prompt: str,
+    output_path: str = None,
+    input_path: str = None,
+    aspect_ratio: str = None,
+    image_size: str = None,
+    verbose: bool = False,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    cache: DiskCache = None,
+    client=None,
+) -> dict:
+    """
+    Async generate_image for running many figures concurrently.
 
-    # Build config
-    generate_config = types.GenerateContentConfig(
-        response_modalities=["IMAGE", "TEXT"]
+    Takes the same arguments as generate_image, plus an optional client
+    (the shared one from get_client() otherwise). File and cache I/O run in
+    a worker thread so other requests keep making progress.
+    """
+    output_path, ratio, size, cache_key, cached = await asyncio.to_thread(
+        _prepare, prompt, output_path, input_path, aspect_ratio, image_size, cache, verbose
     )
-
-    # Add image config if needed
-    if aspect_ratio or image_size:
-        image_config_dict = {}
-        if aspect_ratio:
-            if aspect_ratio not in VALID_ASPECT_RATIOS:
-                print(f"Warning: Invalid aspect ratio '{aspect_ratio}'. Valid options: {VALID_ASPECT_RATIOS}")
-            else:
-                image_config_dict["aspect_ratio"] = aspect_ratio
-        if image_size:
-            if image_size.upper() not in VALID_SIZES:
-                print(f"Warning: Invalid size '{image_size}'. Valid options: {VALID_SIZES}")
-            else:
-                image_config_dict["image_size"] = image_size.upper()
-
-        if image_config_dict:
-            generate_config = types.GenerateContentConfig(
-                response_modalities=["IMAGE", "TEXT"],
-                image_config=types.ImageConfig(**image_config_dict)
-            )
-
-    if verbose:
-        print(f"Model: {MODEL_NAME}")
-        print(f"Prompt: {prompt}")
-        if aspect_ratio:
-            print(f"Aspect ratio: {aspect_ratio}")
-        if image_size:
-            print(f"Size: {image_size}")
-        print("Generating...")
+    if cached:
+        return cached
 
     try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=contents,
-            config=generate_config,
+        client = client or get_client()
+        contents, generate_config = await asyncio.to_thread(
+            build_request, prompt, input_path, ratio, size
         )
+        response = await generate_content_with_retry_async(
+            client, contents, generate_config, max_attempts
+        )
+        return await asyncio.to_thread(
+            _save_response, response, output_path, prompt, aspect_ratio, image_size,
+            input_path, cache, cache_key, verbose,
+        )
+    except Exception as e:
+        return _exception_failure(e)
+
+
+def load_batch(batch_path: str) -> list:
+    """Read a batch file of figure jobs, resolving paths against its directory."""
+    batch_path = Path(batch_path).resolve()
+    entries = json.loads(batch_path.read_text(encoding="utf-8"))
+    if not isinstance(entries, list):
+        raise ValueError("Batch file must be a JSON list of job objects")
+
+    base_dir = batch_path.parent
+    jobs = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Batch entry {i} is not a JSON object")
+        if not entry.get("prompt"):
+            raise ValueError(f"Batch entry {i} has no prompt")
+        if not entry.get("output"):
+            raise ValueError(f"Batch entry {i} has no output path")
+        job = dict(entry)
+        job.setdefault("id", str(i))
+        for key in ("output", "input"):
+            if job.get(key):
+                job[key] = str(base_dir / job[key])
+        jobs.append(job)
+    return jobs
+
+
+async def run_batch(jobs: list, concurrency: int = DEFAULT_CONCURRENCY,
+                    max_attempts: int = DEFAULT_MAX_ATTEMPTS, cache: DiskCache = None) -> list:
+    """
+    Generate batch jobs concurrently, at most `concurrency` requests in flight.
 
-        # Extract image from response
-        image_data = None
-        text_response = None
-
-        for part in response.candidates[0].content.parts:
-            if part.inline_data and part.inline_data.mime_type.startswith("image/"):
-                image_data = part.inline_data.data
-                mime_type = part.inline_data.mime_type
-            elif part.text:
-                text_response = part.text
-
-        if not image_data:
-            error_msg = text_response or "No image generated"
-            return {
-                "success": False,
-                "error": error_msg,
-                "path": None,
-            }
-
-        # Save image
-        with open(output_path, "wb") as f:
-            f.write(image_data)
-
-        if verbose:
-            print(f"Saved: {output_path}")
-            if text_response:
-                print(f"Model response: {text_response}")
-
-        return {
-            "success": True,
-            "path": output_path,
-            "metadata": {
-                "model": MODEL_NAME,
-                "prompt": prompt,
-                "aspect_ratio": aspect_ratio,
-                "image_size": image_size,
-                "input_image": input_path,
-                "timestamp": datetime.now().isoformat(),
-            }
+    All jobs share one client, which is closed afterwards. Results are streamed to stdout as JSON lines
+    as jobs finish and are returned in job order, each with 'id',
+    'success', 'path', 'error', 'cached' and 'elapsed' (seconds).
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(job):
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                outcome = await generate_image_async(
+                    prompt=job["prompt"],
+                    output_path=job["output"],
+                    input_path=job.get("input"),
+                    aspect_ratio=job.get("ratio"),
+                    image_size=job.get("size"),
+                    max_attempts=max_attempts,
+                    cache=cache,
+                )
+            except Exception as e:
+                outcome = _exception_failure(e)
+        result = {
+            "id": job["id"],
+            "success": outcome["success"],
+            "path": str(Path(outcome["path"]).resolve()) if outcome["success"] else None,
+            "error": outcome.get("error"),
+            "cached": outcome.get("metadata", {}).get("cached", False),
+            "elapsed": round(time.monotonic() - start, 3),
         }
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+        return result
 
-    except Exception as e:
-        error_msg = str(e)
-        if "safety" in error_msg.lower():
-            error_msg = "Content blocked by safety filters. Try rephrasing your prompt."
-        elif "quota" in error_msg.lower() or "rate" in error_msg.lower():
-            error_msg = "Rate limit exceeded. Wait a moment and try again."
-
-        return {
-            "success": False,
-            "error": error_msg,
-            "path": None,
-        }
+    try:
+        return await asyncio.gather(*(run_one(job) for job in jobs))
+    finally:
+        await close_client()
 
 
 def main():
@@ -248,10 +547,11 @@ Examples:
   %(prog)s "方法流程图..." -o method_flow.png --ratio 3:4 --size 2K -v
   %(prog)s "装置结构框图..." -o apparatus_structure.png --ratio 3:4 --size 2K -v
   %(prog)s "refine diagram" -i draft.png -o refined.png -v
+  %(prog)s --batch 05_diagrams/figures_jobs.json --concurrency 4
         """
     )
 
-    parser.add_argument("prompt", help="Text prompt for patent diagram generation")
+    parser.add_argument("prompt", nargs="?", help="Text prompt for patent diagram generation")
     parser.add_argument("-o", "--output", help="Output file path")
     parser.add_argument("-i", "--input", help="Input image for editing/refinement")
     parser.add_argument("-r", "--ratio", choices=VALID_ASPECT_RATIOS,
@@ -260,8 +560,54 @@ Examples:
                        help="Image size (2K or 4K)")
     parser.add_argument("-v", "--verbose", action="store_true",
                        help="Show detailed output")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                       help=f"API attempts on transient errors (default: {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument("--batch",
+                       help="JSON list of figure jobs to generate concurrently")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                       help=f"With --batch, maximum requests in flight (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--results",
+                       help="With --batch, results manifest path (default: {batch stem}_results.json)")
+
+    parser.add_argument("--cache", action="store_true",
+                       help=f"Reuse cached images for identical requests (also enabled by {CACHE_ENV}=1)")
+    parser.add_argument("--no-cache", action="store_true",
+                       help="Always call the API, even if the response cache is enabled")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_ROOT / "diagrams"),
+                       help="Response cache directory (default: %(default)s)")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_MB,
+                       help=f"Response cache size cap in MB (default: {DEFAULT_CACHE_MAX_MB})")
+    parser.add_argument("--cache-ttl-days", type=float, default=DEFAULT_CACHE_TTL_DAYS,
+                       help=f"Days before a cached image expires (default: {DEFAULT_CACHE_TTL_DAYS})")
 
     args = parser.parse_args()
+    if bool(args.prompt) == bool(args.batch):
+        parser.error("give either a prompt or --batch")
+
+    cache = open_response_cache(
+        enabled=args.cache,
+        disabled=args.no_cache,
+        cache_dir=args.cache_dir,
+        max_mb=args.cache_max_mb,
+        ttl_days=args.cache_ttl_days,
+    )
+
+    if args.batch:
+        try:
+            jobs = load_batch(args.batch)
+        except (OSError, ValueError) as e:
+            print(f"Error: Invalid batch file: {e}", file=sys.stderr)
+            sys.exit(1)
+        results = asyncio.run(run_batch(jobs, args.concurrency, args.max_attempts, cache))
+        batch_path = Path(args.batch)
+        results_path = Path(args.results or batch_path.with_name(f"{batch_path.stem}_results.json"))
+        results_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        failed = [r["id"] for r in results if not r["success"]]
+        if failed:
+            print(f"Error: {len(failed)}/{len(results)} figure(s) failed: {', '.join(failed)}",
+                  file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
 
     result = generate_image(
         prompt=args.prompt,
@@ -270,6 +616,8 @@ Examples:
         aspect_ratio=args.ratio,
         image_size=args.size.upper() if args.size else None,
         verbose=args.verbose or (args.output is None),
+        max_attempts=args.max_attempts,
+        cache=cache,
     )
 
     if result["success"]: